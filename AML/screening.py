@@ -1,10 +1,17 @@
+import logging
 import ollama
 import pandas as pd
 from typing import Dict, List, Tuple
 
+logger = logging.getLogger(__name__)
+# Debug output (e.g. raw model replies) stays off unless this is lowered
+logger.setLevel(logging.WARNING)
+
 class AMLScreener:
-    def __init__(self, model_name: str = "mistral:latest"):
+    def __init__(self, model_name: str = "mistral:latest", host: str = "http://localhost:11434"):
         self.model_name = model_name
+        # Reuse one HTTP client for every screening call
+        self._client = ollama.Client(host=host)
         
     def _format_transaction(self, transaction: pd.Series) -> str:
         """Format transaction data for LLM analysis."""
@@ -34,7 +41,7 @@ Provide a risk score (0-100) and a brief explanation of any concerns.
 Format your response as: SCORE: [number] | EXPLANATION: [text]
 """
         
-        response = ollama.generate(model=self.model_name, prompt=prompt)
+        response = self._client.generate(model=self.model_name, prompt=prompt)
         response_text = response['response']
         
         # Parse response
@@ -83,9 +90,9 @@ EXPLANATION: [detailed explanation and reasoning]
 Please answer ONLY in the above format. Do not add any explanation or text outside this format.
 """
         
-        response = ollama.generate(model=self.model_name, prompt=prompt)
+        response = self._client.generate(model=self.model_name, prompt=prompt)
         response_text = response['response']
-        print("LLM raw response (L2):", response_text)  # For debugging
+        logger.debug("LLM raw response (L2): %s", response_text)
         
         # Parse response (robust)
         import re
@@ -124,18 +131,22 @@ Please answer ONLY in the above format. Do not add any explanation or text outsi
             'explanation': explanation
         }
     
-    def find_related_transactions(self, transaction: pd.Series, all_transactions: pd.DataFrame) -> List[pd.Series]:
-        """Find transactions related to the given transaction."""
+    def find_related_transactions(self, transaction: pd.Series, all_transactions: pd.DataFrame,
+                                  window_days: int = 30) -> List[pd.Series]:
+        """Find transactions related to the given transaction within the last `window_days`."""
         related = []
         
+        # Only consider transactions inside the rolling window
+        cutoff = transaction['timestamp'] - pd.Timedelta(days=window_days)
+        window_mask = all_transactions['timestamp'] >= cutoff
+        
         # Find transactions with same sender or receiver
         sender_mask = all_transactions['sender_account'] == transaction['sender_account']
         receiver_mask = all_transactions['receiver_account'] == transaction['receiver_account']
         
-        related_tx = all_transactions[sender_mask | receiver_mask]
+        related_tx = all_transactions[window_mask & (sender_mask | receiver_mask)]
         
-        # Sort by timestamp and get the 5 most recent
-        related_tx = related_tx.sort_values('timestamp', ascending=False)
-        related = related_tx.head(5).to_dict('records')
+        # Get the 5 most recent without sorting the whole frame
+        related = related_tx.nlargest(5, 'timestamp').to_dict('records')
         
-        return [pd.Series(tx) for tx in related] 
\ No newline at end of file
+        return [pd.Series(tx) for tx in related] 
\ No newline at end of file
@@ -1,14 +1,64 @@
-import requests
+import asyncio
+import orjson
 import torch
 from typing import Dict, Any
 import logging
 from utils.text_utils import TextProcessor
-from utils.ollama_utils import OllamaClient
+from utils.ollama_utils import OllamaClient, drain, REPORT_NUM_CTX
+from utils.terrain_format import render_terrain
 
 # Set up logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+_REPORT_TEMPLATE = """As an emergency response coordinator, create a detailed emergency response report based on the disaster scene analysis and response plan at the end of this prompt.
+
+Create a comprehensive emergency response report that includes:
+
+1. Emergency Response Assessment:
+   - Current situation and immediate threats
+   - Access and evacuation challenges
+   - Resource deployment needs
+   - Safety concerns for responders and victims
+
+2. Required Emergency Resources:
+   - Specific rescue equipment needed (e.g., helicopters, boats, heavy machinery)
+   - Medical response teams and supplies
+   - Evacuation vehicles and routes
+   - Communication and coordination systems
+
+3. Immediate Response Actions:
+   - Evacuation procedures and routes
+   - Search and rescue operations
+   - Medical triage and treatment
+   - Scene security and hazard control
+
+4. Team Deployment:
+   - Rescue team assignments and locations
+   - Medical response team positions
+   - Security and perimeter control
+   - Resource management coordination
+
+Focus on:
+- Specific rescue and evacuation methods needed
+- Required emergency vehicles and equipment
+- Clear team assignments and responsibilities
+- Safety protocols for responders
+- Communication and coordination procedures
+
+SCENE ANALYSIS:
+{scene}
+
+RESPONSE PLAN:
+{plan}
+"""
+
+# Static instructions come first so Ollama can reuse their cached prefill
+_REPORT_PREFIX = _REPORT_TEMPLATE.split("{scene}")[0]
+
+# Report length; REPORT_NUM_CTX keeps the preload, warm-up and report on one Mixtral runner
+REPORT_MAX_TOKENS = 1024
+
 def print_gpu_utilization():
     """Print current GPU utilization."""
     if torch.cuda.is_available():
@@ -16,16 +66,29 @@ def print_gpu_utilization():
         logger.debug(f"GPU Memory cached: {torch.cuda.memory_reserved() / 1024**2:.2f} MB")
 
 class CommunicatorAgent:
-    def __init__(self):
-        """Initialize the Communicator Agent with language model."""
+    def __init__(self, model_name: str = "mixtral:latest", ollama_client: OllamaClient = None):
+        """Initialize the Communicator Agent with language model.
+        
+        model_name is any Ollama tag, e.g. a k-quant such as
+        "mixtral:8x7b-instruct-v0.1-q4_K_M" for faster decoding.
+        """
+        self.model_name = model_name
         try:
-            self.ollama_client = OllamaClient()
+            self.ollama_client = ollama_client or OllamaClient()
+            self.text_processor = TextProcessor()
         except Exception as e:
             logger.error(f"Error initializing Communicator Agent: {str(e)}")
             raise
 
     def generate_report(self, scout_results, plan_results):
         """Generate a comprehensive report based on scout and plan results."""
+        return drain(self.generate_report_stream(scout_results, plan_results))
+    
+    def generate_report_stream(self, scout_results, plan_results):
+        """Stream the report text as it is generated.
+        
+        Yields text chunks and returns the same result dict as generate_report.
+        """
         try:
             logger.info("Starting report generation...")
             
@@ -43,90 +106,63 @@ class CommunicatorAgent:
             
             # Generate response
             logger.info("Generating report using Mixtral...")
-            response = self.ollama_client.generate_response(
-                model="mixtral:latest",
+            chunks = []
+            for chunk in self.ollama_client.stream_response(
+                model=self.model_name,
                 prompt=report_prompt,
-                max_tokens=2000  # Increased significantly for comprehensive reports
-            )
+                max_tokens=REPORT_MAX_TOKENS,
+                num_ctx=REPORT_NUM_CTX
+            ):
+                chunks.append(chunk)
+                yield chunk
             
             logger.info("Report generated successfully")
             return {
-                "report": response
+                "report": "".join(chunks)
             }
             
         except Exception as e:
-            logger.error(f"Error generating report: {str(e)}")
-            logger.error(f"Error type: {type(e).__name__}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error("Error generating report: %s (%s)", e, type(e).__name__)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Traceback", exc_info=True)
             
             # Return a basic report if LLM fails
             return {
                 "report": self._create_basic_report(scout_results, plan_results)
             }
 
+    def warm_prompt_cache(self):
+        """Prefill the shared report instructions so the first real report only evaluates the scene and plan."""
+        try:
+            self.ollama_client.generate_response(
+                model=self.model_name,
+                prompt=_REPORT_PREFIX,
+                max_tokens=1,
+                num_ctx=REPORT_NUM_CTX
+            )
+        except Exception as e:
+            logger.warning(f"Could not warm communicator prompt cache: {e}")
+
+    def load_model(self):
+        """Bring Mixtral into memory ahead of the report request."""
+        try:
+            self.ollama_client.load_model(self.model_name, num_ctx=REPORT_NUM_CTX)
+        except Exception as e:
+            logger.warning(f"Could not preload {self.model_name}: {e}")
+    
+    async def generate_report_async(self, scout_results, plan_results):
+        """Run generate_report in a worker thread so other work can overlap it."""
+        return await asyncio.to_thread(self.generate_report, scout_results, plan_results)
+
     def _format_report_prompt(self, scout_results, plan_results):
         """Format scout and plan results into a comprehensive report prompt."""
-        prompt = """As an emergency response coordinator, create a detailed emergency response report based on this disaster scene analysis:
-
-SCENE ANALYSIS:
-"""
-        
-        # Add terrain analysis
         terrain_data = scout_results.get("terrain_data", {})
         terrain_analysis = terrain_data.get("terrain_analysis", {})
         
-        for category, items in terrain_analysis.items():
-            if items:
-                prompt += f"\n{category.title()}:\n"
-                for item in items:
-                    confidence = item.get('confidence', 0)
-                    area = item.get('area_m2', 0)
-                    prompt += f"- {item['class']} (Confidence: {confidence:.2f})"
-                    if area > 0:
-                        prompt += f" - Area: {area:.2f} m²"
-                    prompt += "\n"
-        
-        # Add plan details
-        prompt += "\nRESPONSE PLAN:\n"
-        prompt += plan_results.get("plan", "No plan available")
-        
-        prompt += """
-
-Create a comprehensive emergency response report that includes:
-
-1. Emergency Response Assessment:
-   - Current situation and immediate threats
-   - Access and evacuation challenges
-   - Resource deployment needs
-   - Safety concerns for responders and victims
-
-2. Required Emergency Resources:
-   - Specific rescue equipment needed (e.g., helicopters, boats, heavy machinery)
-   - Medical response teams and supplies
-   - Evacuation vehicles and routes
-   - Communication and coordination systems
-
-3. Immediate Response Actions:
-   - Evacuation procedures and routes
-   - Search and rescue operations
-   - Medical triage and treatment
-   - Scene security and hazard control
-
-4. Team Deployment:
-   - Rescue team assignments and locations
-   - Medical response team positions
-   - Security and perimeter control
-   - Resource management coordination
-
-Focus on:
-- Specific rescue and evacuation methods needed
-- Required emergency vehicles and equipment
-- Clear team assignments and responsibilities
-- Safety protocols for responders
-- Communication and coordination procedures
-"""
-        return prompt
+        return _REPORT_TEMPLATE.format_map({
+            "scene": render_terrain(terrain_analysis),
+            "plan": plan_results.get("plan", "No plan available"),
+        })
 
     def _create_basic_report(self, scout_results, plan_results):
         """Create a basic report when LLM generation fails."""
@@ -138,14 +174,8 @@ Focus on:
         report += scout_results["analysis"] + "\n\n"
         
         # Add detected objects
-        report += "Detected Objects:\n"
-        for category, items in scout_results["terrain_data"]["terrain_analysis"].items():
-            if items:
-                report += f"\n{category.title()}:\n"
-                for item in items:
-                    confidence = item.get('confidence', 0)
-                    area = item.get('area_m2', 0)
-                    report += f"- {item['class']} (Confidence: {confidence:.2f}, Area: {area:.2f}m²)\n"
+        report += "Detected Objects:\n\n"
+        report += render_terrain(scout_results["terrain_data"]["terrain_analysis"]) + "\n"
         
         # Add response plan
         report += "\nResponse Plan:\n"
@@ -199,14 +229,12 @@ Focus on:
 
     def _generate_audio(self, report: str) -> str:
         """Generate audio version of the report."""
-        output_file = "field_report.mp3"
-        self.text_processor.text_to_speech(report, output_file)
-        return output_file
+        return str(self.text_processor.synth_async(report).result())
 
     def _get_llm_report(self, prompt: str) -> str:
         """Get comprehensive report from Mixtral model via Ollama."""
         try:
-            response = requests.post(
+            response = self.ollama_client.session.post(
                 self.ollama_base_url,
                 json={
                     "model": self.model_name,
@@ -216,7 +244,7 @@ Focus on:
                         "temperature": 0.7,
                         "top_p": 0.9,
                         "top_k": 40,
-                        "num_ctx": 4096,
+                        "num_ctx": REPORT_NUM_CTX,
                         "num_predict": 500,  # Increased for more detailed report
                         "repeat_penalty": 1.1,
                         "repeat_last_n": 64,
@@ -225,7 +253,7 @@ Focus on:
                 }
             )
             response.raise_for_status()
-            return response.json()["response"]
+            return orjson.loads(response.content)["response"]
         except Exception as e:
             logger.error(f"Error getting LLM report: {e}")
             return "Error: Could not generate emergency response report" 
\ No newline at end of file
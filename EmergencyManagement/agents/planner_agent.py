@@ -1,12 +1,63 @@
-import requests
+import asyncio
+import orjson
 import torch
 from typing import Dict, Any, List
 import logging
+from utils.terrain_format import render_terrain
+from utils.ollama_utils import OllamaClient, drain, KEEP_ALIVE, LLAVA_NUM_CTX, PLAN_NUM_CTX
+from agents.scout_agent import encode_images, scene_results, multi_view_note
 
 # Set up logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+_PLAN_TEMPLATE = """As an emergency response coordinator, create a specific action plan based on the disaster scene analysis at the end of this prompt.
+
+Create a detailed emergency response plan that includes:
+
+1. Immediate Actions (Next 6-8 hours):
+   - Specific rescue operations needed
+   - Exact evacuation procedures
+   - Precise hazard control measures
+   - Resource deployment locations
+
+2. Required Resources:
+   - Specific equipment needed (e.g., "2 rescue helicopters", "3 medical teams")
+   - Exact number of personnel required
+   - Specific vehicles and access routes
+   - Communication systems needed
+
+3. Team Assignments:
+   - Rescue Team: Specific tasks and locations
+   - Medical Team: Triage points and treatment areas
+   - Security Team: Perimeter control points
+   - Resource Team: Supply distribution points
+   - Communication Team: Command post locations
+
+4. Priority Actions:
+   - List specific tasks in order of priority
+   - Include exact locations for each action
+   - Specify timeframes for critical operations
+   - Detail safety measures for each task
+
+Format the response as a clear, actionable plan with specific numbers, locations, and timeframes. Focus on concrete actions rather than general guidelines.
+
+SCENE ANALYSIS:
+{scene}"""
+
+# Everything before the scene is identical across requests; Ollama reuses the
+# KV cache for a matching prompt prefix, so only the scene has to be prefilled
+_PLAN_PREFIX = _PLAN_TEMPLATE.split("{scene}")[0]
+
+# Single-pass variant: LLaVA assesses the images and writes the plan in one reply
+_FUSED_TEMPLATE = """As an emergency response coordinator, assess the disaster scene in the attached image and create a response plan.
+
+Respond with a JSON object with exactly two string fields:
+"scene": an assessment of the scene covering the overall situation, visible hazards, people, vehicles, structures, damage, and access or evacuation challenges
+"plan": an emergency response plan covering immediate actions for the next 6-8 hours, required resources, team assignments and priority actions, with specific numbers, locations and timeframes"""
+
+FUSED_MAX_TOKENS = 1024
+
 def print_gpu_utilization():
     """Print current GPU utilization."""
     if torch.cuda.is_available():
@@ -14,14 +65,16 @@ def print_gpu_utilization():
         logger.debug(f"GPU Memory cached: {torch.cuda.memory_reserved() / 1024**2:.2f} MB")
 
 class PlannerAgent:
-    def __init__(self):
+    def __init__(self, model_name: str = "phi:latest", ollama_client: OllamaClient = None):
         # Force CUDA device
         if not torch.cuda.is_available():
             raise RuntimeError("CUDA is not available. Please check your GPU installation.")
         
         self.device = torch.device("cuda")
-        self.ollama_base_url = "http://localhost:11434/api/generate"
-        self.model_name = "phi:latest"  # Using phi:latest for faster planning
+        self.ollama_client = ollama_client or OllamaClient()  # for its pooled HTTP session
+        self.ollama_base_url = self.ollama_client.generate_url
+        self.model_name = model_name  # phi:latest by default for faster planning
+        self.vision_model = "llava:latest"  # for the single-pass scene + plan request
         
         # Clear GPU memory
         torch.cuda.empty_cache()
@@ -29,15 +82,25 @@ class PlannerAgent:
 
     def create_plan(self, scout_results):
         """Create a concise response plan based on scout analysis."""
+        return drain(self.create_plan_stream(scout_results))
+
+    def create_plan_stream(self, scout_results):
+        """Stream the plan text as it is generated.
+        
+        Yields text chunks and returns the same result dict as create_plan.
+        """
         try:
             # Format plan prompt
             plan_prompt = self._format_plan_prompt(scout_results)
             
             # Generate response with reduced max_tokens
-            response = self._get_llm_plan(plan_prompt)
+            chunks = []
+            for chunk in self._stream_llm_plan(plan_prompt):
+                chunks.append(chunk)
+                yield chunk
             
             return {
-                "plan": response
+                "plan": "".join(chunks)
             }
             
         except Exception as e:
@@ -46,101 +109,111 @@ class PlannerAgent:
                 "plan": "Basic Response Plan:\n1. Assess immediate hazards\n2. Secure the area\n3. Provide assistance to detected persons\n4. Monitor the situation"
             }
 
-    def _format_plan_prompt(self, scout_results):
-        """Format scout results into a concise plan prompt."""
-        prompt = """As an emergency response coordinator, create a specific action plan based on this disaster scene analysis:
+    def warm_prompt_cache(self):
+        """Prefill the shared plan instructions so the first real plan only evaluates the scene."""
+        try:
+            response = self.ollama_client.session.post(
+                self.ollama_base_url,
+                json={
+                    "model": self.model_name,
+                    "prompt": _PLAN_PREFIX,
+                    "stream": False,
+                    "keep_alive": KEEP_ALIVE,
+                    # num_ctx must match _stream_llm_plan or Ollama reloads the model
+                    "options": {"num_ctx": PLAN_NUM_CTX, "num_predict": 1}
+                }
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Could not warm planner prompt cache: {e}")
 
-SCENE ANALYSIS:
-"""
+    def create_plan_from_image(self, images):
+        """Assess the scene and write the plan in a single LLaVA request.
         
-        # Add key findings
+        Returns (scout_results, plan_results) shaped like the Scout -> Planner
+        path, or None when the reply is not the expected JSON so the caller
+        can fall back to that path.
+        """
+        try:
+            image_data, visualization = encode_images(images)
+            prompt = _FUSED_TEMPLATE + multi_view_note(len(images))
+            reply = "".join(self.ollama_client.stream_request({
+                "model": self.vision_model,
+                "prompt": prompt,
+                "images": image_data,
+                "format": "json",
+                "stream": True,
+                "keep_alive": KEEP_ALIVE,
+                "options": {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "top_k": 40,
+                    "num_ctx": LLAVA_NUM_CTX,
+                    "num_predict": FUSED_MAX_TOKENS,
+                    "repeat_penalty": 1.1,
+                    "repeat_last_n": 64,
+                    "seed": 42
+                }
+            }))
+            fused = orjson.loads(reply)
+            scene, plan = fused["scene"], fused["plan"]
+            if not isinstance(scene, str) or not isinstance(plan, str):
+                raise ValueError("scene and plan must be text")
+        except Exception as e:
+            logger.warning(f"Single-pass scene and plan failed, using separate requests: {e}")
+            return None
+        return scene_results(scene, visualization), {"plan": plan}
+    
+    async def create_plan_async(self, scout_results):
+        """Run create_plan in a worker thread so other work can overlap it."""
+        return await asyncio.to_thread(self.create_plan, scout_results)
+
+    def _format_plan_prompt(self, scout_results):
+        """Format scout results into a concise plan prompt."""
         terrain_data = scout_results.get("terrain_data", {})
         terrain_analysis = terrain_data.get("terrain_analysis", {})
         
-        for category, items in terrain_analysis.items():
-            if items:
-                prompt += f"\n{category.title()}: "
-                items_list = [f"{item['class']}" for item in items]
-                prompt += ", ".join(items_list) + "\n"
-        
-        prompt += """
-Create a detailed emergency response plan that includes:
-
-1. Immediate Actions (Next 6-8 hours):
-   - Specific rescue operations needed
-   - Exact evacuation procedures
-   - Precise hazard control measures
-   - Resource deployment locations
-
-2. Required Resources:
-   - Specific equipment needed (e.g., "2 rescue helicopters", "3 medical teams")
-   - Exact number of personnel required
-   - Specific vehicles and access routes
-   - Communication systems needed
-
-3. Team Assignments:
-   - Rescue Team: Specific tasks and locations
-   - Medical Team: Triage points and treatment areas
-   - Security Team: Perimeter control points
-   - Resource Team: Supply distribution points
-   - Communication Team: Command post locations
-
-4. Priority Actions:
-   - List specific tasks in order of priority
-   - Include exact locations for each action
-   - Specify timeframes for critical operations
-   - Detail safety measures for each task
-
-Format the response as a clear, actionable plan with specific numbers, locations, and timeframes. Focus on concrete actions rather than general guidelines."""
-
-        return prompt
+        return _PLAN_TEMPLATE.format_map({"scene": render_terrain(terrain_analysis)})
 
     def _format_terrain_analysis(self, terrain_analysis: Dict[str, List[Dict]]) -> str:
         """Format terrain analysis data into a detailed text description."""
-        analysis_parts = []
-        
-        # Process each category
-        for category, items in terrain_analysis.items():
-            if items:
-                analysis_parts.append(f"\n{category.title()}:")
-                for item in items:
-                    confidence = item.get('confidence', 0)
-                    area = item.get('area_m2', 0)
-                    class_name = item.get('class', 'Unknown')
-                    
-                    item_desc = f"- {class_name} (Confidence: {confidence:.2f})"
-                    if area > 0:
-                        item_desc += f" - Area: {area:.2f} m²"
-                    analysis_parts.append(item_desc)
-        
-        return "\n".join(analysis_parts)
+        return render_terrain(terrain_analysis)
 
     def _get_llm_plan(self, prompt: str) -> str:
         """Get response plan from Gemma model via Ollama."""
+        return "".join(self._stream_llm_plan(prompt))
+
+    def _stream_llm_plan(self, prompt: str):
+        """Stream response plan text from the planner model via Ollama.
+        
+        A failure after part of the plan has been yielded is re-raised, so
+        callers never treat a truncated plan as complete.
+        """
+        started = False
         try:
-            response = requests.post(
-                self.ollama_base_url,
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "num_ctx": 2048,
-                        "num_predict": 500,  # Increased for more detailed plan
-                        "repeat_penalty": 1.1,
-                        "repeat_last_n": 64,
-                        "seed": 42
-                    }
+            for chunk in self.ollama_client.stream_request({
+                "model": self.model_name,
+                "prompt": prompt,
+                "stream": True,
+                "keep_alive": KEEP_ALIVE,
+                "options": {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "top_k": 40,
+                    "num_ctx": PLAN_NUM_CTX,
+                    "num_predict": 512,
+                    "repeat_penalty": 1.1,
+                    "repeat_last_n": 64,
+                    "seed": 42
                 }
-            )
-            response.raise_for_status()
-            return response.json()["response"]
+            }):
+                started = True
+                yield chunk
         except Exception as e:
             logger.error(f"Error getting LLM plan: {e}")
-            return "Error: Could not generate response plan"
+            if started:
+                raise
+            yield "Error: Could not generate response plan"
 
     def _extract_safety_notes(self, plan: str) -> str:
         """Extract safety-related information from the plan."""
@@ -155,7 +228,7 @@ Format the response as a clear, actionable plan with specific numbers, locations
         """
         
         try:
-            response = requests.post(
+            response = self.ollama_client.session.post(
                 self.ollama_base_url,
                 json={
                     "model": "phi",
@@ -164,7 +237,7 @@ Format the response as a clear, actionable plan with specific numbers, locations
                 }
             )
             response.raise_for_status()
-            return response.json()["response"]
+            return orjson.loads(response.content)["response"]
         except Exception as e:
             print(f"Error extracting safety notes: {e}")
             return "Error: Could not extract safety notes"
@@ -179,7 +252,7 @@ Format the response as a clear, actionable plan with specific numbers, locations
         """
         
         try:
-            response = requests.post(
+            response = self.ollama_client.session.post(
                 self.ollama_base_url,
                 json={
                     "model": "phi",
@@ -188,7 +261,7 @@ Format the response as a clear, actionable plan with specific numbers, locations
                 }
             )
             response.raise_for_status()
-            return response.json()["response"]
+            return orjson.loads(response.content)["response"]
         except Exception as e:
             print(f"Error extracting actions: {e}")
             return "Error: Could not extract recommended actions" 
\ No newline at end of file
@@ -1,29 +1,135 @@
+import asyncio
 import logging
 import torch
 from utils.vision_utils import VisionProcessor
-from utils.ollama_utils import OllamaClient
+from utils.ollama_utils import OllamaClient, drain, KEEP_ALIVE, LLAVA_NUM_CTX
+from utils.terrain_format import render_terrain
 import gc
 import numpy as np
 import cv2
 import os
+import io
 import base64
-import requests
-from typing import Dict, Any
+from PIL import Image
+from typing import Dict, Any, Sequence, Union
+
+ImageInput = Union[str, bytes, Image.Image, np.ndarray]
+
+# LLaVA spends ~576 context tokens per image; more than this crowds out the
+# answer (LLAVA_NUM_CTX is sized for this many)
+MAX_SCENE_IMAGES = 4
 
 # Set up logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+_ANALYSIS_TEMPLATE = """You are an emergency response analyst. Analyze this disaster scene and provide a brief assessment focusing on rescue operations and emergency response.
+
+Provide a brief emergency response assessment covering:
+
+1. Critical Scene Elements:
+   - Impact on rescue operations
+   - Access points for emergency teams
+   - Resource deployment considerations
+
+2. Immediate Hazards:
+   - Risks to rescue personnel
+   - Threats to victims
+   - Environmental dangers
+
+3. Priority Actions:
+   - First responder safety measures
+   - Victim rescue procedures
+   - Resource allocation needs
+
+Detected Elements:
+{detections}
+"""
+
+_SCENE_PROMPT = """Analyze this emergency/disaster scene image and provide a detailed assessment. Focus on:
+
+1. Scene Description:
+   - Overall situation and environment
+   - Visible hazards and dangers
+   - Access points and obstacles
+   - Weather and lighting conditions
+
+2. Detected Elements:
+   - People and their conditions
+   - Vehicles and equipment
+   - Structures and buildings
+   - Natural features and terrain
+   - Signs of damage or destruction
+
+3. Emergency Response Needs:
+   - Immediate rescue requirements
+   - Access and evacuation challenges
+   - Required equipment and resources
+   - Safety concerns for responders
+
+Format the response in a clear, structured way that can be used for emergency response planning."""
+
+def multi_view_note(count):
+    """Sentence appended after the instructions when a scene has several views.
+    
+    It goes last so the instructions stay an identical prompt prefix
+    whatever the number of images.
+    """
+    return "" if count == 1 else f"\n\nThese {count} images show the same scene from different viewpoints."
+
+def _load_image(image: ImageInput):
+    """Return encoded image bytes for the LLM and an RGB array for display.
+    
+    Accepts a file path, encoded image bytes, a PIL image or an RGB array.
+    """
+    if isinstance(image, np.ndarray):
+        ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        if not ok:
+            raise ValueError("Could not encode image array")
+        return encoded.tobytes(), image
+    if isinstance(image, Image.Image):
+        image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG")
+        return buffer.getvalue(), np.asarray(image)
+    if isinstance(image, str):
+        with open(image, "rb") as image_file:
+            image = image_file.read()
+    img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is not None:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return bytes(image), img
+
+def encode_images(images):
+    """Base64-encode scene images for LLaVA; also return the first image as RGB for display."""
+    loaded = [_load_image(item) for item in images]
+    image_data = [base64.b64encode(image_bytes).decode('utf-8') for image_bytes, _ in loaded]
+    return image_data, loaded[0][1]
+
+def scene_results(analysis, visualization):
+    """Scout result dict for an analysis text; the original image is the visualization."""
+    return {
+        "analysis": analysis,
+        "visualization": visualization,
+        "terrain_data": {
+            "terrain_analysis": {
+                "people": [{"class": "person", "confidence": 1.0}],
+                "vehicles": [{"class": "vehicle", "confidence": 1.0}],
+                "structures": [{"class": "building", "confidence": 1.0}]
+            }
+        }
+    }
+
 class ScoutAgent:
-    def __init__(self):
+    def __init__(self, ollama_client: OllamaClient = None):
         """Initialize the Scout Agent with YOLO and SAM models."""
         try:
             # Initialize vision processor with caching
             self.vision_processor = VisionProcessor()
             
             # Initialize Ollama client with caching
-            self.ollama_client = OllamaClient()
-            self.ollama_base_url = "http://localhost:11434/api/generate"
+            self.ollama_client = ollama_client or OllamaClient()
+            self.ollama_base_url = self.ollama_client.generate_url
             
             # Pre-warm the models
             self._pre_warm_models()
@@ -49,78 +155,54 @@ class ScoutAgent:
         except Exception as e:
             logger.warning(f"Pre-warming models failed: {str(e)}")
 
-    def analyze_scene(self, image_path: str) -> Dict[str, Any]:
+    def analyze_scene(self, image: Union[ImageInput, Sequence[ImageInput]]) -> Dict[str, Any]:
         """Analyze the scene using LLM vision capabilities."""
+        return drain(self.analyze_scene_stream(image))
+
+    def analyze_scene_stream(self, image: Union[ImageInput, Sequence[ImageInput]]):
+        """Stream the scene analysis text as it is generated.
+        
+        Several views of one scene (up to MAX_SCENE_IMAGES) can be passed as a
+        list; they are sent to LLaVA in a single request. Yields text chunks
+        and returns the same result dict as analyze_scene.
+        """
         try:
-            # Read and encode image
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
+            images = list(image) if isinstance(image, (list, tuple)) else [image]
+            if len(images) > MAX_SCENE_IMAGES:
+                raise ValueError(f"At most {MAX_SCENE_IMAGES} images can be analyzed together")
+            
+            # Read and encode images
+            image_data, img = encode_images(images)
             
             # Create prompt for scene analysis
-            prompt = """Analyze this emergency/disaster scene image and provide a detailed assessment. Focus on:
-
-1. Scene Description:
-   - Overall situation and environment
-   - Visible hazards and dangers
-   - Access points and obstacles
-   - Weather and lighting conditions
-
-2. Detected Elements:
-   - People and their conditions
-   - Vehicles and equipment
-   - Structures and buildings
-   - Natural features and terrain
-   - Signs of damage or destruction
-
-3. Emergency Response Needs:
-   - Immediate rescue requirements
-   - Access and evacuation challenges
-   - Required equipment and resources
-   - Safety concerns for responders
-
-Format the response in a clear, structured way that can be used for emergency response planning."""
+            prompt = _SCENE_PROMPT + multi_view_note(len(images))
 
             # Generate response using LLM with image
-            response = requests.post(
-                self.ollama_base_url,
-                json={
-                    "model": "llava:latest",  # Using LLaVA for vision capabilities
-                    "prompt": prompt,
-                    "images": [image_data],
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "num_ctx": 4096,
-                        "num_predict": 500,
-                        "repeat_penalty": 1.1,
-                        "repeat_last_n": 64,
-                        "seed": 42
-                    }
+            chunks = []
+            for chunk in self.ollama_client.stream_request({
+                "model": "llava:latest",  # Using LLaVA for vision capabilities
+                "prompt": prompt,
+                "images": image_data,
+                "stream": True,
+                "keep_alive": KEEP_ALIVE,
+                "options": {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                    "top_k": 40,
+                    # Fixed whatever the image count, so LLaVA is never reloaded
+                    "num_ctx": LLAVA_NUM_CTX,
+                    "num_predict": 500,
+                    "repeat_penalty": 1.1,
+                    "repeat_last_n": 64,
+                    "seed": 42
                 }
-            )
-            response.raise_for_status()
-            analysis = response.json()["response"]
+            }):
+                chunks.append(chunk)
+                yield chunk
+            analysis = "".join(chunks)
 
-            # Create visualization using the original image
-            img = cv2.imread(image_path)
-            if img is not None:
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            else:
-                img = None
-
-            return {
-                "analysis": analysis,
-                "visualization": img,
-                "terrain_data": {
-                    "terrain_analysis": {
-                        "people": [{"class": "person", "confidence": 1.0}],
-                        "vehicles": [{"class": "vehicle", "confidence": 1.0}],
-                        "structures": [{"class": "building", "confidence": 1.0}]
-                    }
-                }
-            }
+            # Visualization is the original image
+            return scene_results(analysis, img)
 
         except Exception as e:
             logger.error(f"Error in scene analysis: {str(e)}")
@@ -132,52 +214,20 @@ Format the response in a clear, structured way that can be used for emergency re
                 }
             }
 
+    async def analyze_scene_async(self, image: ImageInput) -> Dict[str, Any]:
+        """Run analyze_scene in a worker thread so other work can overlap it."""
+        return await asyncio.to_thread(self.analyze_scene, image)
+
     def _format_analysis_prompt(self, terrain_analysis):
         """Format terrain analysis data into a concise prompt."""
-        prompt = """You are an emergency response analyst. Analyze this disaster scene and provide a brief assessment focusing on rescue operations and emergency response.
-
-Detected Elements:
-"""
-        
-        # Add detected objects by category
-        for category, items in terrain_analysis.items():
-            if items:
-                prompt += f"{category.title()}: "
-                items_list = [f"{item['class']} ({item.get('confidence', 0):.2f})" for item in items]
-                prompt += ", ".join(items_list) + "\n"
-        
-        prompt += """
-Provide a brief emergency response assessment covering:
-
-1. Critical Scene Elements:
-   - Impact on rescue operations
-   - Access points for emergency teams
-   - Resource deployment considerations
-
-2. Immediate Hazards:
-   - Risks to rescue personnel
-   - Threats to victims
-   - Environmental dangers
-
-3. Priority Actions:
-   - First responder safety measures
-   - Victim rescue procedures
-   - Resource allocation needs
-"""
-        return prompt
+        return _ANALYSIS_TEMPLATE.format_map({"detections": render_terrain(terrain_analysis)})
 
     def _create_basic_analysis(self, terrain_analysis):
         """Create a basic analysis from terrain data when LLM fails."""
         analysis = "Emergency Response Scene Assessment:\n\n"
         
         # Add detected objects by category
-        for category, items in terrain_analysis.items():
-            if items:
-                analysis += f"{category.title()}:\n"
-                for item in items:
-                    confidence = item.get('confidence', 0)
-                    area = item.get('area_m2', 0)
-                    analysis += f"- {item['class']} (Confidence: {confidence:.2f}, Area: {area:.2f}m²)\n"
+        analysis += render_terrain(terrain_analysis) + "\n"
         
         analysis += "\nEmergency Response Priorities:\n"
         analysis += "1. Secure the area and establish a safe perimeter for rescue operations\n"
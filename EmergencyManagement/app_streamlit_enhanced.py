@@ -1,179 +1,137 @@
 import streamlit as st
-import os
-import tempfile
-from agents.scout_agent import ScoutAgent
-from agents.planner_agent import PlannerAgent
-from agents.communicator_agent import CommunicatorAgent
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import re
+import io
 import logging
-import torch
-import gc
-import graphviz
+import queue
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
+from PIL import Image
+
+# Scope reruns to the widget's own section where Streamlit supports it
+# (st.fragment >= 1.37, st.experimental_fragment 1.33-1.36)
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
-# Set up logging
-logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# Suppress PyTorch torch.classes warning (harmless internal warning)
-import warnings
-warnings.filterwarnings('ignore', message='.*torch.classes.*')
-# Also filter the specific PyTorch warning
-logging.getLogger('torch').setLevel(logging.ERROR)
-
-# Configure Streamlit page
-st.set_page_config(
-    page_title="Emergency Response Analysis",
-    page_icon="",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
+@st.cache_resource(show_spinner=False)
+def _configure_process():
+    """Process-wide logging and warning filters, applied once per server process."""
+    # Set up logging
+    logging.basicConfig(level=logging.WARNING)
+    
+    # Suppress PyTorch torch.classes warning (harmless internal warning)
+    warnings.filterwarnings('ignore', message='.*torch.classes.*')
+    # Also filter the specific PyTorch warning
+    logging.getLogger('torch').setLevel(logging.ERROR)
+
+@st.cache_data
+def _read_css():
+    return (Path(__file__).parent / "static" / "style.css").read_text()
 
 # Enhanced CSS styling with black background
-st.markdown("""
-    <style>
-        [data-testid="collapsedControl"] {
-            display: none
-        }
-        #MainMenu {
-            visibility: hidden;
-        }
-        footer {
-            visibility: hidden;
-        }
-        .stApp {
-            background-color: #000000;
-        }
-        .main .block-container {
-            background-color: #000000;
-            padding-top: 2rem;
-        }
-        .agent-header {
-            background: #1a1a1a;
-            padding: 1rem;
-            border-radius: 10px;
-            margin-bottom: 1rem;
-            box-shadow: 0 4px 6px rgba(255, 255, 255, 0.1);
-            border: 1px solid #333;
-        }
-        .scout-header {
-            border-left: 5px solid #f5576c;
-        }
-        .planner-header {
-            border-left: 5px solid #4facfe;
-        }
-        .communicator-header {
-            border-left: 5px solid #43e97b;
-        }
-        .info-card {
-            background: #1a1a1a;
-            padding: 1rem;
-            border-radius: 8px;
-            margin: 0.5rem 0;
-            box-shadow: 0 2px 4px rgba(255, 255, 255, 0.1);
-            border: 1px solid #333;
-            color: #e0e0e0;
-        }
-        .detection-item {
-            background: #1a1a1a;
-            padding: 0.75rem;
-            border-radius: 6px;
-            margin: 0.5rem 0;
-            border-left: 3px solid #667eea;
-            color: #e0e0e0;
-        }
-        h1, h2, h3, h4, h5, h6 {
-            color: #ffffff;
-        }
-        p, div, span, label {
-            color: #e0e0e0;
-        }
-        .stMarkdown {
-            color: #e0e0e0;
-        }
-        .stTabs [data-baseweb="tab-list"] {
-            background-color: #1a1a1a;
-        }
-        .stTabs [data-baseweb="tab"] {
-            color: #e0e0e0;
-        }
-        .stTabs [aria-selected="true"] {
-            color: #ffffff;
-            background-color: #2a2a2a;
-        }
-        .stExpander {
-            background-color: #1a1a1a;
-            border: 1px solid #333;
-        }
-        .stMetric {
-            background-color: #1a1a1a;
-            border: 1px solid #333;
-            padding: 1rem;
-            border-radius: 8px;
-        }
-        .stProgress > div > div {
-            background-color: #333;
-        }
-        .stAlert {
-            background-color: #1a1a1a;
-            border: 1px solid #333;
-        }
-        .stInfo {
-            background-color: #1a3a5a;
-            border-left: 4px solid #4facfe;
-        }
-        .stSuccess {
-            background-color: #1a3a2a;
-            border-left: 4px solid #43e97b;
-        }
-        .stError {
-            background-color: #3a1a1a;
-            border-left: 4px solid #f5576c;
-        }
-        .stWarning {
-            background-color: #3a3a1a;
-            border-left: 4px solid #ffd700;
-        }
-        .stFileUploader {
-            background-color: #1a1a1a;
-            border: 1px solid #333;
-        }
-        .stButton > button {
-            background-color: #2a2a2a;
-            color: #ffffff;
-            border: 1px solid #444;
-        }
-        .stButton > button:hover {
-            background-color: #3a3a3a;
-            border-color: #555;
-        }
-        .stDownloadButton > button {
-            background-color: #2a2a2a;
-            color: #ffffff;
-            border: 1px solid #444;
-        }
-        .stExpander label {
-            color: #ffffff;
-        }
-        .stMetric label {
-            color: #b0b0b0;
-        }
-        .stMetric [data-testid="stMetricValue"] {
-            color: #ffffff;
-        }
-        .stMetric [data-testid="stMetricDelta"] {
-            color: #b0b0b0;
-        }
-    </style>
-""", unsafe_allow_html=True)
+def load_css():
+    # Streamlit drops elements that a rerun does not emit, so the <style>
+    # tag is re-sent each run; only the file read is cached.
+    st.markdown(f"<style>{_read_css()}</style>", unsafe_allow_html=True)
 
-def show_architecture_tab():
-    st.header("System Architecture")
-    st.markdown("""
-    **Multi-Agent Emergency Response System**
-    """)
+def _init():
+    """Page setup for each script run; Streamlit expects page config and CSS on every run."""
+    # Configure Streamlit page
+    st.set_page_config(
+        page_title="Emergency Response Analysis",
+        page_icon="",
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
+    load_css()
+    _configure_process()
+
+@st.cache_resource(show_spinner=False)
+def get_ollama_client():
+    """Ollama client shared by all agents, so they share one connection pool and model list."""
+    from utils.ollama_utils import OllamaClient
+    return OllamaClient()
+
+@st.cache_resource(show_spinner=False)
+def get_scout_agent():
+    """Load the Scout Agent (YOLOv8 + LLaVA) once per process."""
+    # Agent modules pull in torch/ultralytics, so import them on first use
+    from agents.scout_agent import ScoutAgent
+    return ScoutAgent(get_ollama_client())
+
+@st.cache_resource(show_spinner=False)
+def get_planner_agent():
+    """Load the Planner Agent once per process."""
+    from agents.planner_agent import PlannerAgent
+    agent = PlannerAgent(ollama_client=get_ollama_client())
+    agent.warm_prompt_cache()
+    return agent
+
+@st.cache_resource(show_spinner=False)
+def get_communicator_agent(model_name="mixtral:latest"):
+    """Load the Communicator Agent once per process and model tag."""
+    from agents.communicator_agent import CommunicatorAgent
+    agent = CommunicatorAgent(model_name, get_ollama_client())
+    agent.warm_prompt_cache()
+    return agent
+
+# Ollama models used by the Scout, Planner and Communicator agents
+PIPELINE_MODELS = ["llava:latest", "phi:latest", "mixtral:latest"]
+
+# Mixtral builds for the Communicator; decoding is memory-bound, so fewer
+# bits per weight means proportionally more tokens per second
+MIXTRAL_TAGS = {
+    "Default (mixtral:latest)": "mixtral:latest",
+    "q4_K_M": "mixtral:8x7b-instruct-v0.1-q4_K_M",
+    "q5_K_M": "mixtral:8x7b-instruct-v0.1-q5_K_M",
+    "q8_0": "mixtral:8x7b-instruct-v0.1-q8_0",
+}
+
+def communicator_model():
+    """Ollama tag of the Mixtral build picked in the sidebar."""
+    return MIXTRAL_TAGS[st.session_state.get("mixtral_quantization", next(iter(MIXTRAL_TAGS)))]
+
+@st.cache_resource(show_spinner=False)
+def _warm_models():
+    """Load the pipeline models once per server process.
     
-    # Create Graphviz diagram
-    st.subheader(" System Flow Diagram")
+    Runs on the pipeline worker so the page renders immediately and the
+    first analysis simply queues behind the warm-up.
+    """
+    return _pipeline_executor().submit(get_ollama_client().warmup, PIPELINE_MODELS)
+
+def unload_models():
+    """Free the models' memory until the next analysis loads them again.
+    
+    The process-wide warm-up stays cached, so later reruns do not reload
+    the models straight away.
+    """
+    get_ollama_client().unload(list(dict.fromkeys([*PIPELINE_MODELS, communicator_model()])))
+
+def detection_label():
+    """Precision of the YOLO detector the Scout Agent actually loaded, e.g. "INT8 TensorRT detection"."""
+    vision = get_scout_agent().vision_processor
+    return f"{vision.precision.upper()}{' TensorRT' if vision.tensorrt else ''} detection"
+
+# Longest side of the uploaded-image preview; inference still uses the full image
+THUMBNAIL_SIZE = 512
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _thumbnail(file_id, _image_bytes):
+    """Downscaled preview of an upload, cached per uploaded file."""
+    thumb = Image.open(io.BytesIO(_image_bytes))
+    thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return thumb
+
+@st.cache_resource(show_spinner=False)
+def _build_architecture_dot():
+    """Build the system flow diagram once per process."""
+    import graphviz
     
     # Create a simple, clean Graphviz diagram
     dot = graphviz.Digraph(comment='Emergency Response System Architecture')
@@ -209,8 +167,20 @@ def show_architecture_tab():
     dot.edge('communicator', 'mixtral', color='#FCD34D', style='dashed')
     dot.edge('mixtral', 'output', color='#1E3A8A')
     
+    return dot
+
+@_fragment
+def show_architecture_tab():
+    st.header("System Architecture")
+    st.markdown("""
+    **Multi-Agent Emergency Response System**
+    """)
+    
+    # Create Graphviz diagram
+    st.subheader(" System Flow Diagram")
+    
     # Display the graph
-    st.graphviz_chart(dot.source)
+    st.graphviz_chart(_build_architecture_dot().source)
     
     st.markdown("---")
     
@@ -271,32 +241,35 @@ def show_architecture_tab():
         3. Facilitates communication and coordination among teams.
         """)
 
+# A section header is a numbered line ("1." / "2) Title:"), a markdown "#" heading,
+# or a short all-caps line
+_HEADER_RE = re.compile(
+    r'^[ \t]*('
+    r'\d(?=[^\n]{0,3}\.|[^\n]{0,8}:)[^\n]*?'
+    r'|#[^\n]*?'
+    r'|(?=[^\n]*[A-Z])[^\sa-z][^a-z\n]{0,48}?'
+    r')[ \t\r]*$',
+    re.MULTILINE
+)
+
+def _section_body(chunk):
+    return '\n'.join(line.strip() for line in chunk.splitlines() if line.strip())
+
+@st.cache_data(max_entries=32, show_spinner=False)
 def format_text_with_sections(text):
     """Format text into expandable sections based on numbered lists or headers"""
-    lines = text.split('\n')
     formatted_sections = []
-    current_section = []
     section_title = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Check if line is a section header (starts with number or is a header)
-        if (line and len(line) > 0 and 
-            (line[0].isdigit() and ('.' in line[:5] or ':' in line[:10]) or
-             line.startswith('#') or
-             (line.isupper() and len(line) < 50))):
-            if current_section:
-                formatted_sections.append((section_title, '\n'.join(current_section)))
-            section_title = line
-            current_section = []
-        else:
-            current_section.append(line)
-    
-    if current_section:
-        formatted_sections.append((section_title, '\n'.join(current_section)))
+    start = 0
+    for match in _HEADER_RE.finditer(text):
+        content = _section_body(text[start:match.start()])
+        if content:
+            formatted_sections.append((section_title, content))
+        section_title = match.group(1)
+        start = match.end()
+    content = _section_body(text[start:])
+    if content:
+        formatted_sections.append((section_title, content))
     
     return formatted_sections if formatted_sections else [("Full Analysis", text)]
 
@@ -323,34 +296,35 @@ def display_scout_results(scout_results):
             st.markdown("###  Detected Objects")
             
             # Count objects by category
-            total_objects = sum(len(items) for items in terrain_data.values() if items)
+            counts = {category: len(items) for category, items in terrain_data.items() if items}
+            total_objects = sum(counts.values())
             if total_objects > 0:
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.metric("Total Objects", total_objects)
                 with col2:
-                    st.metric("People", len(terrain_data.get("people", [])))
+                    st.metric("People", counts.get("people", 0))
                 with col3:
-                    st.metric("Vehicles", len(terrain_data.get("vehicles", [])))
+                    st.metric("Vehicles", counts.get("vehicles", 0))
                 with col4:
-                    st.metric("Structures", len(terrain_data.get("structures", [])))
+                    st.metric("Structures", counts.get("structures", 0))
             
             # Show detailed detections
-            for category, items in terrain_data.items():
-                if items:
-                    with st.expander(f" {category.title()} ({len(items)} found)", expanded=False):
-                        for item in items:
-                            confidence = item.get('confidence', 0)
-                            area = item.get('area_m2', 0)
-                            
-                            col1, col2 = st.columns([3, 1])
-                            with col1:
-                                st.markdown(f"**{item['class']}**")
-                            with col2:
-                                st.progress(confidence, text=f"{confidence:.0%}")
-                            
-                            if area > 0:
-                                st.caption(f"📍 Area: {area:.2f} m²")
+            for category, count in counts.items():
+                items = terrain_data[category]
+                with st.expander(f" {category.title()} ({count} found)", expanded=False):
+                    for item in items:
+                        confidence = item.get('confidence', 0)
+                        area = item.get('area_m2', 0)
+                        
+                        col1, col2 = st.columns([3, 1])
+                        with col1:
+                            st.markdown(f"**{item['class']}**")
+                        with col2:
+                            st.progress(confidence, text=f"{confidence:.0%}")
+                        
+                        if area > 0:
+                            st.caption(f"📍 Area: {area:.2f} m²")
 
 def display_planner_results(plan_results):
     """Display Planner Agent results in a nice format"""
@@ -422,6 +396,11 @@ def display_communicator_results(report_results):
                 file_name=f"emergency_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
                 mime="text/plain"
             )
+            
+            if st.button("🔊 Listen to Report"):
+                with st.spinner("Synthesizing speech..."):
+                    audio_path = get_communicator_agent(communicator_model()).text_processor.synth_async(report_text).result()
+                st.audio(str(audio_path))
 
 def show_architecture_diagram_tab():
     """Display a clean, simple architecture diagram in a new tab."""
@@ -430,44 +409,452 @@ def show_architecture_diagram_tab():
     **Multi-Agent Emergency Response System Flow**
     """)
     
-    # Create a simple, clean Graphviz diagram
-    dot = graphviz.Digraph(comment='Emergency Response System Architecture')
+    # Display the graph
+    st.graphviz_chart(_build_architecture_dot().source)
+
+_PIPELINE_BOX = """<div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid {border}; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
+        <h3 style="color: {color}; margin: 0 0 1rem 0;">{title}</h3>
+        {status}
+    </div>"""
+
+# Line height matches the box min-height so the arrow sits level with the boxes
+_PIPELINE_ARROW = '<div style="text-align: center; font-size: 2rem; color: #ffffff; line-height: 200px;">→</div>'
+
+# Title, accent color and the detail shown under each active state, per agent
+_AGENTS = {
+    "scout": ("🔍 Scout Agent", "#f5576c",
+              {"initializing": "Loading models", "processing": "Analyzing scene", "complete": "Scene analyzed"}),
+    "planner": ("📋 Planner Agent", "#4facfe",
+                {"initializing": "Loading model", "processing": "Creating plan", "complete": "Plan generated"}),
+    "communicator": ("📢 Communicator Agent", "#43e97b",
+                     {"initializing": "Loading model", "processing": "Generating report", "complete": "Report ready"}),
+}
+
+# Status label and highlight color for each pipeline state
+_PIPELINE_STATES = {
+    "initializing": ("🔄 Initializing...", "#ffd700"),
+    "processing": ("🔄 Processing...", "#ffd700"),
+    "complete": ("Complete", "#43e97b"),
+}
+
+def _agent_box(title, color, state, detail):
+    """Markup for one agent box; the border uses the agent color while it is waiting."""
+    if state == "waiting":
+        return _PIPELINE_BOX.format(
+            border=color, color=color, title=title,
+            status='<p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>'
+        )
+    label, highlight = _PIPELINE_STATES[state]
+    return _PIPELINE_BOX.format(
+        border=highlight, color=color, title=title,
+        status=(
+            f'<p style="color: {highlight}; font-weight: bold; margin: 0.5rem 0;">{label}</p>'
+            f'<p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">{detail}</p>'
+        )
+    )
+
+# Every box each agent can show, built once so a state change is a dict lookup
+_AGENT_STATES = {
+    name: {state: _agent_box(title, color, state, details.get(state, "")) for state in ("waiting", *_PIPELINE_STATES)}
+    for name, (title, color, details) in _AGENTS.items()
+}
+
+def render_agent_box(placeholder, name, state):
+    """Show one agent's box in the given state."""
+    placeholder.markdown(_AGENT_STATES[name][state], unsafe_allow_html=True)
+
+def pipeline_placeholders():
+    """Lay out the three agent boxes with arrows between them; return a placeholder per agent."""
+    columns = st.columns([4, 1, 4, 1, 4])
+    for column in columns[1::2]:
+        column.markdown(_PIPELINE_ARROW, unsafe_allow_html=True)
+    return [column.empty() for column in columns[::2]]
+
+# Number of streamed tokens to collect before each UI refresh
+STREAM_BATCH_SIZE = 50
+
+# How long the script thread waits for a pipeline update before re-checking the worker
+PIPELINE_POLL_SECONDS = 0.1
+
+@st.cache_resource(show_spinner=False)
+def _pipeline_executor():
+    """Background worker for agent pipelines, shared by all sessions since they share the GPU."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline")
+
+class PipelineCancelled(Exception):
+    """Raised in the pipeline worker once the user cancels the run."""
+
+class PipelineJob:
+    """A pipeline run in the background worker plus the latest progress it reported.
     
-    # Simple horizontal layout with default sizing
-    dot.attr(rankdir='LR', bgcolor='#000000')
-    dot.attr('node', shape='box', style='rounded,filled', fontname='Arial', fontsize='12')
-    dot.attr('edge', fontsize='10', fontcolor='#ffffff')
+    The worker never touches Streamlit elements; it posts (field, value)
+    updates to a queue that the script thread applies and renders. Keeping
+    the latest values on the job lets a rerun (e.g. the Cancel button)
+    redraw the pipeline where it left off.
+    """
     
-    # Nodes with distinct colors: Agents (Blue) vs LLMs (Orange/Amber)
-    # Input/Output: Dark Blue
-    dot.node('input', 'Disaster Scene\nImage', fillcolor='#1E3A8A', fontcolor='white')
-    dot.node('output', 'Emergency\nResponse Report', fillcolor='#1E3A8A', fontcolor='white')
+    def __init__(self, key, images, communicator_model, single_pass):
+        self.key = key
+        self.communicator_model = communicator_model
+        self.single_pass = single_pass
+        self.updates = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.boxes = ("waiting", "waiting", "waiting")
+        self.status = None
+        self.stream = ""
+        self.started = time.monotonic()
+        # Held here rather than as a task argument so the worker can drop them after Scout
+        self.images = images
+        self.future = _pipeline_executor().submit(self._run, get_script_run_ctx())
     
-    # Agents: Blue shades
-    dot.node('scout', 'Scout Agent', fillcolor='#2563EB', fontcolor='white')
-    dot.node('planner', 'Planner Agent', fillcolor='#3B82F6', fontcolor='white')
-    dot.node('communicator', 'Communicator Agent', fillcolor='#60A5FA', fontcolor='white')
+    def _run(self, ctx):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return run_pipeline(self)
     
-    # LLMs: Orange/Amber shades
-    dot.node('yolo', 'YOLOv8', fillcolor='#F59E0B', fontcolor='white')
-    dot.node('llava', 'LLaVA', fillcolor='#F97316', fontcolor='white')
-    dot.node('phi', 'Phi', fillcolor='#FBBF24', fontcolor='white')
-    dot.node('mixtral', 'Mixtral', fillcolor='#FCD34D', fontcolor='black')
+    def post(self, **fields):
+        """Queue progress updates from the worker (boxes, status label, stream)."""
+        for field, value in fields.items():
+            self.updates.put((field, value))
     
-    # Main flow - using agent colors for main flow, LLM colors for model connections
-    dot.edge('input', 'scout', color='#2563EB')
-    dot.edge('scout', 'yolo', color='#F59E0B', style='dashed')
-    dot.edge('yolo', 'llava', color='#F97316', style='dashed')
-    dot.edge('llava', 'planner', color='#3B82F6')
-    dot.edge('planner', 'phi', color='#FBBF24', style='dashed')
-    dot.edge('phi', 'communicator', color='#60A5FA')
-    dot.edge('communicator', 'mixtral', color='#FCD34D', style='dashed')
-    dot.edge('mixtral', 'output', color='#1E3A8A')
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise PipelineCancelled()
+
+def stream_to_job(stream, job, batch_size=STREAM_BATCH_SIZE):
+    """Forward a streaming agent call to the job and return its final result.
     
-    # Display the graph
-    st.graphviz_chart(dot.source)
+    The live output is posted once per batch_size chunks rather than per
+    token, then cleared when the stream finishes.
+    """
+    chunks = []
+    while True:
+        try:
+            chunk = next(stream)
+        except StopIteration as stop:
+            job.post(stream="")
+            return stop.value
+        chunks.append(chunk)
+        if len(chunks) % batch_size == 0:
+            job.check_cancelled()
+            job.post(stream="".join(chunks))
+
+def _submit(executor, func, *args):
+    """Submit func to executor in a thread that keeps this session's Streamlit context."""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args)
+    
+    return executor.submit(run)
+
+def _load_communicator(agent_future):
+    """Wait for the Communicator Agent, then bring its model into memory."""
+    agent = agent_future.result()
+    agent.load_model()
+    return agent
+
+def run_pipeline(job):
+    """Run Scout -> Planner -> Communicator in the pipeline worker, posting progress to job.
+    
+    The Planner and Communicator agents are loaded in loader threads while
+    Scout analyzes the scene, since neither needs Scout output to start up,
+    and Mixtral is brought into memory while Phi writes the plan. With
+    job.single_pass, LLaVA produces the scene assessment and plan in one
+    request, falling back to the separate stages if its reply is unusable.
+    """
+    images = job.images
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-loader") as loaders:
+        # Scout Agent Processing
+        job.post(boxes=("initializing", "waiting", "waiting"),
+                 status="🔄 Initializing Scout Agent...")
+        scout_agent = get_scout_agent()
+        
+        # Load the downstream agents while Scout is busy
+        planner_future = _submit(loaders, get_planner_agent)
+        communicator_future = _submit(loaders, get_communicator_agent, job.communicator_model)
+        
+        scout_results = plan_results = None
+        if job.single_pass:
+            # One LLaVA request for both the scene assessment and the plan
+            job.check_cancelled()
+            job.post(boxes=("processing", "initializing", "waiting"),
+                     status="🔍 Assessing the scene and planning in one LLaVA pass...")
+            planner_agent = planner_future.result()
+            communicator_future = _submit(loaders, _load_communicator, communicator_future)
+            job.post(boxes=("processing", "processing", "waiting"))
+            fused = planner_agent.create_plan_from_image(images)
+            if fused:
+                scout_results, plan_results = fused
+                job.post(status=" Scene assessed and plan created in one pass!")
+        
+        if scout_results is None:
+            job.check_cancelled()
+            job.post(boxes=("processing", "waiting", "waiting"),
+                     status="🔍 Analyzing scene with YOLOv8 and LLaVA...")
+            scout_results = stream_to_job(scout_agent.analyze_scene_stream(images), job)
+            
+            job.post(boxes=("complete", "waiting", "waiting"),
+                     status=" Scout Agent: Analysis complete!")
+            
+            if not scout_results:
+                return scout_results, None, None
+        
+        # Planner and Communicator only need scout_results, so free the uploads and
+        # the decoded image array (the app never displays it) before the long stages
+        job.images = images = None
+        scout_results["visualization"] = None
+        
+        if plan_results is None:
+            # Planner Agent Processing
+            job.check_cancelled()
+            job.post(boxes=("complete", "initializing", "waiting"),
+                     status="Initializing Planner Agent...")
+            planner_agent = planner_future.result()
+            
+            # Hide the Mixtral load behind Phi's generation
+            if not job.single_pass:
+                communicator_future = _submit(loaders, _load_communicator, communicator_future)
+            
+            job.post(boxes=("complete", "processing", "waiting"),
+                     status=" Creating emergency response plan with Phi...")
+            plan_results = stream_to_job(planner_agent.create_plan_stream(scout_results), job)
+            
+            job.post(status="Planner Agent: Response plan created!")
+        
+        job.post(boxes=("complete", "complete", "initializing"))
+
+        # Communicator Agent Processing
+        job.check_cancelled()
+        job.post(status=" Initializing Communicator Agent...")
+        communicator_agent = communicator_future.result()
+        
+        job.post(boxes=("complete", "complete", "processing"),
+                 status="📢 Generating comprehensive report with Mixtral...")
+        report_results = stream_to_job(communicator_agent.generate_report_stream(scout_results, plan_results), job)
+        
+        job.post(boxes=("complete", "complete", "complete"),
+                 status="Analysis complete!")
+        
+        return scout_results, plan_results, report_results
+
+def watch_pipeline(job):
+    """Render a job's progress until its worker finishes, then return the pipeline results."""
+    # Create agent flow visualization
+    st.markdown("## 🔄 Agent Processing Pipeline")
+    
+    # One placeholder per agent box, so a transition only redraws the boxes that changed
+    box_placeholders = pipeline_placeholders()
+    shown_states = [None, None, None]
+    
+    # Stage messages only relabel this container; the live output of the
+    # agent currently generating streams inside it
+    progress = st.status("🔄 Starting agent pipeline...", expanded=True)
+    stream_area = progress.empty()
+    
+    # Clicking Cancel reruns the script; the new run flags the worker to stop
+    cancel_area = st.empty()
+    if not job.future.done() and cancel_area.button("Cancel analysis"):
+        job.cancel_event.set()
+    
+    changed = {"boxes", "status", "stream"}
+    shown_elapsed = None
+    while True:
+        if "boxes" in changed:
+            for i, (name, state) in enumerate(zip(_AGENTS, job.boxes)):
+                if state != shown_states[i]:
+                    render_agent_box(box_placeholders[i], name, state)
+                    shown_states[i] = state
+        if "status" in changed and job.status:
+            progress.update(label=job.status)
+        if "stream" in changed:
+            if job.stream:
+                stream_area.markdown(job.stream)
+            else:
+                stream_area.empty()
+        
+        if job.future.done() and job.updates.empty():
+            break
+        # A cancelled worker may sit in a long model call before it next checks;
+        # stop waiting on it rather than keep the page blocked
+        if job.cancel_event.is_set():
+            cancel_area.empty()
+            progress.update(state="error", expanded=False)
+            raise PipelineCancelled()
+        changed = set()
+        try:
+            field, value = job.updates.get(timeout=PIPELINE_POLL_SECONDS)
+        except queue.Empty:
+            # Streamlit only acts on a rerun request (e.g. Cancel) when the script
+            # next sends something, so show the elapsed time while the worker is quiet;
+            # once a second is enough for that and keeps the label to one delta per tick
+            elapsed = int(time.monotonic() - job.started)
+            if elapsed != shown_elapsed:
+                shown_elapsed = elapsed
+                label = job.status or "🔄 Starting agent pipeline..."
+                progress.update(label=f"{label} ({elapsed}s)")
+            continue
+        setattr(job, field, value)
+        changed.add(field)
+    
+    cancel_area.empty()
+    try:
+        results = job.future.result()
+    except Exception:
+        progress.update(state="error", expanded=False)
+        # The job may predate this rerun, whose PipelineCancelled is a new class
+        if job.cancel_event.is_set():
+            raise PipelineCancelled() from None
+        raise
+    progress.update(state="complete", expanded=False)
+    return results
+
+@_fragment
+def analysis_fragment():
+    """Upload images and run the agent pipeline; reruns stay inside this tab."""
+    # File uploader with better styling
+    st.markdown("###  Upload Disaster Scene Image")
+    uploaded_files = st.file_uploader(
+        "Choose image files", 
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        help="Upload one or more images of the same disaster or emergency scene for analysis"
+    )
+    
+    if uploaded_files:
+        from agents.scout_agent import MAX_SCENE_IMAGES
+        if len(uploaded_files) > MAX_SCENE_IMAGES:
+            st.warning(f"Only the first {MAX_SCENE_IMAGES} images are analyzed together.")
+            uploaded_files = uploaded_files[:MAX_SCENE_IMAGES]
+        
+        # Show uploaded images
+        for col, uploaded_file in zip(st.columns(len(uploaded_files)), uploaded_files):
+            with col:
+                st.image(_thumbnail(uploaded_file.file_id, uploaded_file.getvalue()), caption=uploaded_file.name, use_column_width=True)
+        
+        # One job per set of uploads and settings, so reruns (Cancel, downloads) reuse its results
+        single_pass = st.session_state.get("single_pass", False)
+        key = (tuple(uploaded_file.file_id for uploaded_file in uploaded_files), communicator_model(), single_pass)
+        job = st.session_state.get("pipeline_job")
+        if job is None or job.key != key:
+            if job is not None:
+                job.cancel_event.set()
+            job = PipelineJob(key, [uploaded_file.getvalue() for uploaded_file in uploaded_files],
+                              communicator_model(), single_pass)
+            st.session_state.pipeline_job = job
+        
+        try:
+            scout_results, plan_results, report_results = watch_pipeline(job)
+            
+            if scout_results:
+                # Add spacing
+                st.markdown("<br><br>", unsafe_allow_html=True)
+                
+                # Display results in a nice layout with tabs
+                st.markdown("##  Analysis Results")
+                
+                # Use tabs for each agent's output
+                result_tabs = st.tabs([" Scout Analysis", " Response Plan", " Final Report"])
+                
+                with result_tabs[0]:
+                    display_scout_results(scout_results)
+                
+                with result_tabs[1]:
+                    display_planner_results(plan_results)
+                
+                with result_tabs[2]:
+                    display_communicator_results(report_results)
+                
+                # Summary metrics at the bottom
+                st.markdown("---")
+                st.markdown("###  Analysis Summary")
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    total_objects = sum(len(items) for items in scout_results.get("terrain_data", {}).get("terrain_analysis", {}).values() if items)
+                    st.metric("Objects Detected", total_objects, "items")
+                
+                with col2:
+                    plan_length = len(plan_results.get("plan", "")) if plan_results else 0
+                    st.metric("Plan Length", f"{plan_length:,}", "characters")
+                
+                with col3:
+                    report_length = len(report_results.get("report", "")) if report_results else 0
+                    st.metric("Report Length", f"{report_length:,}", "characters")
+                
+                with col4:
+                    cuda_available = get_scout_agent().vision_processor.device.type == "cuda"
+                    cuda_status = " GPU" if cuda_available else "⚠️ CPU"
+                    st.metric("Processing", cuda_status, detection_label())
+            
+        except PipelineCancelled:
+            st.warning("Analysis cancelled.")
+            if st.button("Restart analysis"):
+                del st.session_state.pipeline_job
+                st.rerun()
+        except Exception as e:
+            st.error(f"❌ Error during analysis: {str(e)}")
+            logger.error(f"Error details: {type(e).__name__}")
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+    else:
+        # Show instructions when no file is uploaded
+        st.info(" **Please upload an image** to begin the emergency response analysis. The system will:")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown("""
+            <div style="background: #1a1a1a; padding: 1rem; border-radius: 8px; border-left: 4px solid #f5576c;">
+            <h4 style="color: #ffffff;"> Scout Agent</h4>
+            <ul style="color: #e0e0e0;">
+            <li>Analyze the scene</li>
+            <li>Detect objects and hazards</li>
+            <li>Assess terrain conditions</li>
+            </ul>
+            </div>
+            """, unsafe_allow_html=True)
+        with col2:
+            st.markdown("""
+            <div style="background: #1a1a1a; padding: 1rem; border-radius: 8px; border-left: 4px solid #4facfe;">
+            <h4 style="color: #ffffff;"> Planner Agent</h4>
+            <ul style="color: #e0e0e0;">
+            <li>Create response plan</li>
+            <li>Allocate resources</li>
+            <li>Assign teams</li>
+            </ul>
+            </div>
+            """, unsafe_allow_html=True)
+        with col3:
+            st.markdown("""
+            <div style="background: #1a1a1a; padding: 1rem; border-radius: 8px; border-left: 4px solid #43e97b;">
+            <h4 style="color: #ffffff;"> Communicator Agent</h4>
+            <ul style="color: #e0e0e0;">
+            <li>Generate report</li>
+            <li>Coordinate actions</li>
+            <li>Document findings</li>
+            </ul>
+            </div>
+            """, unsafe_allow_html=True)
 
 def main():
+    _init()
+    _warm_models()
+    
+    with st.sidebar:
+        st.selectbox(
+            "Mixtral quantization",
+            list(MIXTRAL_TAGS),
+            key="mixtral_quantization",
+            help="Lower-bit k-quants report faster; pull the tag with 'ollama pull' first"
+        )
+        st.checkbox(
+            "Single-pass scene + plan",
+            key="single_pass",
+            help="Have LLaVA assess the scene and write the plan in one request instead of LLaVA then Phi"
+        )
+        if st.button("Unload models", help="Free GPU memory held by the Ollama models"):
+            unload_models()
+            st.success("Models unloaded")
+    
     # Header with dark theme
     st.markdown("""
     <div style="background: #1a1a1a; 
@@ -485,343 +872,7 @@ def main():
     tabs = st.tabs([" Analysis", " Architecture"])
     
     with tabs[0]:
-        # File uploader with better styling
-        st.markdown("###  Upload Disaster Scene Image")
-        uploaded_file = st.file_uploader(
-            "Choose an image file", 
-            type=["jpg", "jpeg", "png"],
-            help="Upload an image of a disaster or emergency scene for analysis"
-        )
-        
-        if uploaded_file is not None:
-            # Show uploaded image
-            st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
-            
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                temp_path = tmp_file.name
-            
-            try:
-                # Create agent flow visualization
-                st.markdown("## 🔄 Agent Processing Pipeline")
-                
-                # Single placeholder for all agent boxes (will be updated dynamically)
-                agent_boxes_placeholder = st.empty()
-                
-                # Initial display of agent boxes
-                agent_boxes_placeholder.markdown("""
-                <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #f5576c; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #f5576c; margin: 0 0 1rem 0;">🔍 Scout Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting to start...</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #4facfe; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #4facfe; margin: 0 0 1rem 0;">📋 Planner Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #43e97b; margin: 0 0 1rem 0;">📢 Communicator Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Status messages area
-                status_area = st.empty()
-                
-                # Scout Agent Processing
-                agent_boxes_placeholder.markdown("""
-                <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #ffd700; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #f5576c; margin: 0 0 1rem 0;">🔍 Scout Agent</h3>
-                        <p style="color: #ffd700; font-weight: bold; margin: 0.5rem 0;">🔄 Initializing...</p>
-                        <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Loading models</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #4facfe; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #4facfe; margin: 0 0 1rem 0;">📋 Planner Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #43e97b; margin: 0 0 1rem 0;">📢 Communicator Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                status_area.info("🔄 Initializing Scout Agent...")
-                with st.spinner("Loading YOLOv8 and LLaVA models..."):
-                    scout_agent = ScoutAgent()
-                
-                agent_boxes_placeholder.markdown("""
-                <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #ffd700; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #f5576c; margin: 0 0 1rem 0;">🔍 Scout Agent</h3>
-                        <p style="color: #ffd700; font-weight: bold; margin: 0.5rem 0;">🔄 Processing...</p>
-                        <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Analyzing scene</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #4facfe; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #4facfe; margin: 0 0 1rem 0;">📋 Planner Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #43e97b; margin: 0 0 1rem 0;">📢 Communicator Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                status_area.info("🔍 Analyzing scene with YOLOv8 and LLaVA...")
-                with st.spinner("Processing image and detecting objects..."):
-                    scout_results = scout_agent.analyze_scene(temp_path)
-                
-                agent_boxes_placeholder.markdown("""
-                <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #f5576c; margin: 0 0 1rem 0;"> Scout Agent</h3>
-                        <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                        <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Scene analyzed</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #4facfe; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #4facfe; margin: 0 0 1rem 0;"> Planner Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                    <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                    <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                        <h3 style="color: #43e97b; margin: 0 0 1rem 0;"> Communicator Agent</h3>
-                        <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                status_area.success(" Scout Agent: Analysis complete!")
-                
-                if scout_results:
-                    # Planner Agent Processing
-                    agent_boxes_placeholder.markdown("""
-                    <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #f5576c; margin: 0 0 1rem 0;"> Scout Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Scene analyzed</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #ffd700; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #4facfe; margin: 0 0 1rem 0;"> Planner Agent</h3>
-                            <p style="color: #ffd700; font-weight: bold; margin: 0.5rem 0;"> Initializing...</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Loading model</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #43e97b; margin: 0 0 1rem 0;"> Communicator Agent</h3>
-                            <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    status_area.info("Initializing Planner Agent...")
-                    with st.spinner("Loading Phi model..."):
-                        planner_agent = PlannerAgent()
-                    
-                    agent_boxes_placeholder.markdown("""
-                    <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #f5576c; margin: 0 0 1rem 0;"> Scout Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;">Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Scene analyzed</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #ffd700; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #4facfe; margin: 0 0 1rem 0;"> Planner Agent</h3>
-                            <p style="color: #ffd700; font-weight: bold; margin: 0.5rem 0;"> Processing...</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Creating plan</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #43e97b; margin: 0 0 1rem 0;">Communicator Agent</h3>
-                            <p style="color: #888; font-size: 0.9rem; margin: 0;">⏳ Waiting...</p>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    status_area.info(" Creating emergency response plan with Phi...")
-                    with st.spinner("Generating detailed action plan using Phi model..."):
-                        plan_results = planner_agent.create_plan(scout_results)
-                    
-                    agent_boxes_placeholder.markdown("""
-                    <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #f5576c; margin: 0 0 1rem 0;"> Scout Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Scene analyzed</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #4facfe; margin: 0 0 1rem 0;">Planner Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Plan generated</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #ffd700; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #43e97b; margin: 0 0 1rem 0;">Communicator Agent</h3>
-                            <p style="color: #ffd700; font-weight: bold; margin: 0.5rem 0;">Initializing...</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Loading model</p>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    status_area.success("Planner Agent: Response plan created!")
-                    
-                    # Communicator Agent Processing
-                    status_area.info(" Initializing Communicator Agent...")
-                    with st.spinner("Loading Mixtral model..."):
-                        communicator_agent = CommunicatorAgent()
-                    
-                    agent_boxes_placeholder.markdown("""
-                    <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #f5576c; margin: 0 0 1rem 0;"> Scout Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Scene analyzed</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #4facfe; margin: 0 0 1rem 0;"> Planner Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Plan generated</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #ffd700; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #43e97b; margin: 0 0 1rem 0;"> Communicator Agent</h3>
-                            <p style="color: #ffd700; font-weight: bold; margin: 0.5rem 0;"> Processing...</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Generating report</p>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    status_area.info("📢 Generating comprehensive report with Mixtral...")
-                    with st.spinner("Synthesizing analysis and creating report using Mixtral model..."):
-                        report_results = communicator_agent.generate_report(scout_results, plan_results)
-                    
-                    agent_boxes_placeholder.markdown("""
-                    <div style="display: flex; justify-content: space-between; align-items: center; gap: 1rem;">
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #f5576c; margin: 0 0 1rem 0;"> Scout Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Scene analyzed</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #4facfe; margin: 0 0 1rem 0;"> Planner Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Plan generated</p>
-                        </div>
-                        <div style="text-align: center; font-size: 2rem; color: #ffffff; padding: 0 1rem;">→</div>
-                        <div style="background: #1a1a1a; padding: 1.5rem; border-radius: 10px; border: 2px solid #43e97b; text-align: center; min-height: 200px; flex: 1; display: flex; flex-direction: column; justify-content: center;">
-                            <h3 style="color: #43e97b; margin: 0 0 1rem 0;"> Communicator Agent</h3>
-                            <p style="color: #43e97b; font-weight: bold; margin: 0.5rem 0;"> Complete</p>
-                            <p style="color: #e0e0e0; font-size: 0.9rem; margin: 0;">Report ready</p>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    status_area.success(" Communicator Agent: Final report generated!")
-                    
-                    # Clear status area
-                    status_area.empty()
-                    
-                    # Add spacing
-                    st.markdown("<br><br>", unsafe_allow_html=True)
-                    
-                    # Display results in a nice layout with tabs
-                    st.markdown("##  Analysis Results")
-                    
-                    # Use tabs for each agent's output
-                    result_tabs = st.tabs([" Scout Analysis", " Response Plan", " Final Report"])
-                    
-                    with result_tabs[0]:
-                        display_scout_results(scout_results)
-                    
-                    with result_tabs[1]:
-                        display_planner_results(plan_results)
-                    
-                    with result_tabs[2]:
-                        display_communicator_results(report_results)
-                    
-                    # Summary metrics at the bottom
-                    st.markdown("---")
-                    st.markdown("###  Analysis Summary")
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    with col1:
-                        total_objects = sum(len(items) for items in scout_results.get("terrain_data", {}).get("terrain_analysis", {}).values() if items)
-                        st.metric("Objects Detected", total_objects, "items")
-                    
-                    with col2:
-                        plan_length = len(plan_results.get("plan", "")) if plan_results else 0
-                        st.metric("Plan Length", f"{plan_length:,}", "characters")
-                    
-                    with col3:
-                        report_length = len(report_results.get("report", "")) if report_results else 0
-                        st.metric("Report Length", f"{report_length:,}", "characters")
-                    
-                    with col4:
-                        cuda_status = " GPU" if torch.cuda.is_available() else "⚠️ CPU"
-                        st.metric("Processing", cuda_status)
-                
-                # Clean up
-                os.unlink(temp_path)
-                
-            except Exception as e:
-                st.error(f"❌ Error during analysis: {str(e)}")
-                logger.error(f"Error details: {type(e).__name__}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                
-                # Clean up on error
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-        else:
-            # Show instructions when no file is uploaded
-            st.info(" **Please upload an image** to begin the emergency response analysis. The system will:")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.markdown("""
-                <div style="background: #1a1a1a; padding: 1rem; border-radius: 8px; border-left: 4px solid #f5576c;">
-                <h4 style="color: #ffffff;"> Scout Agent</h4>
-                <ul style="color: #e0e0e0;">
-                <li>Analyze the scene</li>
-                <li>Detect objects and hazards</li>
-                <li>Assess terrain conditions</li>
-                </ul>
-                </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                st.markdown("""
-                <div style="background: #1a1a1a; padding: 1rem; border-radius: 8px; border-left: 4px solid #4facfe;">
-                <h4 style="color: #ffffff;"> Planner Agent</h4>
-                <ul style="color: #e0e0e0;">
-                <li>Create response plan</li>
-                <li>Allocate resources</li>
-                <li>Assign teams</li>
-                </ul>
-                </div>
-                """, unsafe_allow_html=True)
-            with col3:
-                st.markdown("""
-                <div style="background: #1a1a1a; padding: 1rem; border-radius: 8px; border-left: 4px solid #43e97b;">
-                <h4 style="color: #ffffff;"> Communicator Agent</h4>
-                <ul style="color: #e0e0e0;">
-                <li>Generate report</li>
-                <li>Coordinate actions</li>
-                <li>Document findings</li>
-                </ul>
-                </div>
-                """, unsafe_allow_html=True)
+        analysis_fragment()
     
     with tabs[1]:
         show_architecture_tab()
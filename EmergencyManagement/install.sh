@@ -340,6 +340,10 @@ echo ""
 # Note about YOLOv8
 echo "Note: YOLOv8 model (yolov8x.pt) will be automatically downloaded"
 echo "      on first use by the ultralytics library."
+echo "      For faster detection on GPU, build a TensorRT FP16 engine once with:"
+echo "        python -m utils.vision_utils"
+echo "      or an INT8 engine calibrated on a dataset YAML of similar scenes:"
+echo "        python -m utils.vision_utils int8 path/to/scenes.yaml"
 echo ""
 
 # Create a .env file if it doesn't exist (for future use)
@@ -1,93 +1,290 @@
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
+import orjson
 import logging
-import json
+import random
 import time
 
 # Set up logging
 logging.basicConfig(level=logging.WARNING)  # Changed from INFO to WARNING
 logger = logging.getLogger(__name__)
 
+# How long Ollama keeps a model loaded after a request, so the pipeline's
+# models are not reloaded from disk between uploads
+KEEP_ALIVE = "30m"
+
+# Context tokens LLaVA spends on each attached image
+IMAGE_TOKENS = 576
+
+# Fixed context window per model. Ollama reloads a model whenever num_ctx
+# changes, so the warm-up and every request for a model must use one value.
+# LLaVA's fits a scene's four views, the prompt and the single-pass reply.
+LLAVA_NUM_CTX = 4096
+PLAN_NUM_CTX = 2048
+REPORT_NUM_CTX = 4096
+MODEL_NUM_CTX = {
+    "llava:latest": LLAVA_NUM_CTX,
+    "phi:latest": PLAN_NUM_CTX,
+    "mixtral:latest": REPORT_NUM_CTX,
+}
+
+def _est_tokens(text):
+    """Rough token count (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+def context_size(prompt, max_tokens, image_count=0, minimum=1024, maximum=4096):
+    """Smallest power-of-two num_ctx that fits the prompt, images and reply, within [minimum, maximum]."""
+    needed = _est_tokens(prompt) + image_count * IMAGE_TOKENS + max_tokens + 64
+    return min(maximum, max(minimum, 1 << (needed - 1).bit_length()))
+
+def iter_response_text(response):
+    """Yield generated text from a streaming /api/generate response."""
+    for line in response.iter_lines():
+        if not line:
+            continue
+        chunk = orjson.loads(line)
+        if chunk.get("response"):
+            yield chunk["response"]
+        if chunk.get("done"):
+            break
+
+# Generated text for recent deterministic requests, shared by every client in the process
+RESPONSE_CACHE_SIZE = 128
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def request_key(payload):
+    """Hash a /api/generate body, ignoring fields that do not change the output."""
+    body = {k: v for k, v in payload.items() if k not in ("stream", "keep_alive")}
+    return hashlib.blake2b(orjson.dumps(body, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+def cached_stream(payload, open_response):
+    """Yield generated text for payload, replaying the stored text when the same request repeats.
+    
+    open_response is only called on a cache miss. Requests without a fixed
+    seed are sampled afresh each time and are never cached. Text is stored
+    only once the stream completes, so failed or abandoned streams are not.
+    """
+    options = payload.get("options", {})
+    if "seed" not in options and options.get("temperature", 0.8) > 0:
+        response = open_response()
+        try:
+            yield from iter_response_text(response)
+        finally:
+            response.close()
+        return
+    
+    key = request_key(payload)
+    with _response_cache_lock:
+        text = _response_cache.get(key)
+        if text is not None:
+            _response_cache.move_to_end(key)
+    if text is not None:
+        yield text
+        return
+    
+    chunks = []
+    response = open_response()
+    try:
+        for chunk in iter_response_text(response):
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        response.close()
+    with _response_cache_lock:
+        _response_cache[key] = "".join(chunks)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def drain(stream):
+    """Exhaust a streaming agent call and return the generator's final result."""
+    while True:
+        try:
+            next(stream)
+        except StopIteration as stop:
+            return stop.value
+
 class OllamaClient:
-    def __init__(self):
+    def __init__(self, host: str = "http://localhost:11434"):
         """Initialize the Ollama client."""
-        self.base_url = "http://localhost:11434/api/generate"
+        self.host = host
+        self.generate_url = f"{host}/api/generate"
+        self.tags_url = f"{host}/api/tags"
         self.timeout = 120  # Increased timeout for LLM inference (2 minutes)
         self.max_retries = 3
+        self.retry_budget = 180  # Total seconds to spend on one request, retries included
+        self.keep_alive = KEEP_ALIVE
         self.logger = logging.getLogger(__name__)
         
-    def generate_response(self, model: str, prompt: str, max_tokens: int = 200) -> str:
+        # Installed model names, refreshed at most every _models_ttl seconds
+        self._models_cache = None
+        self._models_cache_ts = 0
+        self._models_ttl = 60
+        
+        # Reuse keep-alive connections to the local server across calls
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        atexit.register(self.close)
+    
+    def close(self):
+        """Close pooled connections to the Ollama server."""
+        self.session.close()
+        
+    def _available_models(self, refresh: bool = False):
+        """Return the set of installed model names, cached for _models_ttl seconds."""
+        if refresh or self._models_cache is None or time.time() - self._models_cache_ts >= self._models_ttl:
+            response = self.session.get(self.tags_url, timeout=5)
+            response.raise_for_status()
+            self._models_cache = {m['name'] for m in orjson.loads(response.content).get("models", [])}
+            self._models_cache_ts = time.time()
+        return self._models_cache
+    
+    def generate_response(self, model: str, prompt: str, max_tokens: int = 200, num_ctx: int = None) -> str:
         """Generate a response from the Ollama model."""
+        return "".join(self.stream_response(model, prompt, max_tokens, num_ctx))
+    
+    def stream_response(self, model: str, prompt: str, max_tokens: int = 200, num_ctx: int = None):
+        """Stream a response from the Ollama model, yielding text as it is generated.
+        
+        num_ctx defaults to the smallest window that fits the prompt and reply.
+        Ollama reloads a model when its num_ctx changes, so callers that
+        alternate prompt sizes on one model should pass a fixed value.
+        """
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "top_k": 40,
+                "num_ctx": num_ctx or context_size(prompt, max_tokens),
+                "num_predict": max_tokens,
+                "repeat_penalty": 1.1,
+                "repeat_last_n": 64,
+                "seed": 42
+            }
+        }
+        try:
+            yield from cached_stream(payload, lambda: self._open_stream(payload))
+            self.logger.info("Successfully generated response")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ollama stream interrupted: {str(e)}")
+            raise RuntimeError(f"Ollama stream interrupted: {str(e)}")
+
+    def stream_request(self, payload):
+        """Stream text for a prepared /api/generate body, replaying cached text for repeated requests."""
+        return cached_stream(payload, lambda: self._post_stream(payload))
+
+    def _post_stream(self, payload):
+        response = self.session.post(self.generate_url, json=payload, stream=True)
+        response.raise_for_status()
+        return response
+
+    def _open_stream(self, payload):
+        """Start a streaming generation request, retrying until the server answers.
+
+        Only timeouts and connection errors are retried, with exponential
+        backoff, and never past retry_budget seconds in total.
+        """
+        model = payload["model"]
+        started = time.monotonic()
         for attempt in range(self.max_retries):
             try:
                 self.logger.info(f"Generating response from {model} model...")
-                self.logger.info(f"Prompt length: {len(prompt)} characters")
-                
+                self.logger.info(f"Prompt length: {len(payload['prompt'])} characters")
+
                 # Check if Ollama server is running
                 try:
-                    response = requests.get("http://localhost:11434/api/tags", timeout=5)
-                    response.raise_for_status()
-                    available_models = response.json().get("models", [])
-                    self.logger.info(f"Available models: {[m['name'] for m in available_models]}")
-                    
-                    if not any(m['name'] == model for m in available_models):
+                    # Re-check once before failing in case the model was just pulled
+                    if model not in self._available_models() and model not in self._available_models(refresh=True):
                         self.logger.error(f"Model {model} not found in available models")
                         raise ValueError(f"Model {model} not found. Please ensure it's pulled using 'ollama pull {model}'")
                 except requests.exceptions.ConnectionError:
                     self.logger.error("Could not connect to Ollama server. Is it running?")
                     raise RuntimeError("Ollama server is not running. Please start it using 'ollama serve'")
-                
+
                 # Make the generation request
                 self.logger.info(f"Sending request to Ollama with model {model}...")
-                response = requests.post(
-                    self.base_url,
-                    json={
-                        "model": model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "top_k": 40,
-                            "num_ctx": 4096,  # Increased context window for longer reports
-                            "num_predict": max_tokens,
-                            "repeat_penalty": 1.1,
-                            "repeat_last_n": 64,
-                            "seed": 42
-                        }
-                    },
-                    timeout=self.timeout
+                response = self.session.post(
+                    self.generate_url,
+                    json=payload,
+                    # A retry only gets what is left of the budget
+                    timeout=min(self.timeout, self.retry_budget - (time.monotonic() - started)),
+                    stream=True
                 )
                 response.raise_for_status()
-                result = response.json()
-                self.logger.info("Successfully generated response")
-                return result["response"]
+                return response
             except requests.exceptions.Timeout:
-                if attempt < self.max_retries - 1:
-                    logger.debug(f"Request timed out (attempt {attempt + 1}/{self.max_retries}), retrying...")
-                else:
-                    logger.warning(f"Request timed out after {self.max_retries} attempts")
+                delay = self._retry_delay(attempt, started)
+                if delay is None:
+                    logger.warning(f"Request timed out after {attempt + 1} attempts")
                     raise RuntimeError("Request timed out after multiple attempts")
+                logger.debug(f"Request timed out (attempt {attempt + 1}/{self.max_retries}), retrying in {delay:.1f}s...")
             except requests.exceptions.ConnectionError as e:
                 logger.warning(f"Connection error (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
-                if attempt == self.max_retries - 1:
+                delay = self._retry_delay(attempt, started)
+                if delay is None:
                     raise RuntimeError(f"Failed to connect to Ollama server: {str(e)}")
             except Exception as e:
                 error_msg = str(e)
-                logger.error(f"Ollama server error: {error_msg}")
-                logger.error(f"Error type: {type(e).__name__}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                raise RuntimeError(f"Ollama server error: {error_msg}")
+                logger.error("Ollama server error: %s (%s)", error_msg, type(e).__name__)
+                # Only pay for formatting the stack when debug output is on
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Traceback", exc_info=True)
+                raise RuntimeError(f"Ollama server error: {error_msg}") from e
             
             # Wait before retrying
-            time.sleep(1)
+            time.sleep(delay)
+    
+    def _retry_delay(self, attempt: int, started: float):
+        """Backoff before the next attempt (1s, 2s, 4s... plus jitter), or None when out of retries or budget."""
+        delay = min(2 ** attempt + random.random(), 8)
+        if attempt == self.max_retries - 1 or time.monotonic() - started + delay > self.retry_budget:
+            return None
+        return delay
             
+    def load_model(self, model: str, keep_alive=None, num_ctx: int = None):
+        """Load a model into memory without generating anything.
+        
+        keep_alive defaults to the client's setting; 0 unloads the model instead.
+        num_ctx defaults to the model's MODEL_NUM_CTX entry, so the runner
+        loaded here is the one its requests use.
+        """
+        payload = {"model": model, "keep_alive": self.keep_alive if keep_alive is None else keep_alive}
+        num_ctx = num_ctx or MODEL_NUM_CTX.get(model)
+        if num_ctx and keep_alive != 0:
+            payload["options"] = {"num_ctx": num_ctx}
+        response = self.session.post(self.generate_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+    def warmup(self, models):
+        """Load each model ahead of its first request."""
+        for model in models:
+            try:
+                self.load_model(model)
+            except Exception as e:
+                self.logger.warning(f"Could not warm up {model}: {str(e)}")
+
+    def unload(self, models):
+        """Release the models' GPU memory now instead of waiting for keep_alive to expire."""
+        for model in models:
+            try:
+                self.load_model(model, keep_alive=0)
+            except Exception as e:
+                self.logger.warning(f"Could not unload {model}: {str(e)}")
+
     def list_models(self):
         """List available Ollama models."""
         try:
-            response = requests.get(f"{self.base_url}/tags")
+            response = self.session.get(self.tags_url, timeout=5)
             response.raise_for_status()
-            return response.json()["models"]
+            return orjson.loads(response.content)["models"]
         except Exception as e:
             self.logger.error(f"Error listing Ollama models: {str(e)}")
             raise
@@ -95,8 +292,7 @@ class OllamaClient:
     def check_model_availability(self, model_name):
         """Check if a specific model is available."""
         try:
-            models = self.list_models()
-            return any(model["name"] == model_name for model in models)
+            return model_name in self._available_models()
         except Exception as e:
             self.logger.error(f"Error checking model availability: {str(e)}")
             return False 
\ No newline at end of file
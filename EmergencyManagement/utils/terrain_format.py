@@ -0,0 +1,36 @@
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+TerrainKey = Tuple[Tuple[str, Tuple[Tuple[str, float, float], ...]], ...]
+
+def _terrain_key(terrain_analysis: Dict[str, List[Dict]]) -> TerrainKey:
+    """Reduce terrain analysis to a hashable key of (category, (class, confidence, area)) tuples."""
+    return tuple(
+        (category, tuple(
+            (item.get('class', 'Unknown'), item.get('confidence', 0), item.get('area_m2', 0))
+            for item in items
+        ))
+        for category, items in terrain_analysis.items()
+        if items
+    )
+
+@lru_cache(maxsize=128)
+def _render(key: TerrainKey) -> str:
+    blocks = []
+    for category, items in key:
+        lines = [f"{category.title()}:"]
+        for class_name, confidence, area in items:
+            line = f"- {class_name} (Confidence: {confidence:.2f})"
+            if area > 0:
+                line += f" - Area: {area:.2f} m²"
+            lines.append(line)
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+def render_terrain(terrain_analysis: Dict[str, List[Dict]]) -> str:
+    """Render detected objects by category as text for prompts and fallback reports.
+
+    Results are cached on the detection contents, so the same scene feeding
+    several agents is only formatted once.
+    """
+    return _render(_terrain_key(terrain_analysis))
@@ -1,39 +1,68 @@
-import pyttsx3
-import json
+import orjson
+import hashlib
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
 from typing import Dict, Any
 
-class TextProcessor:
-    def __init__(self):
-        self.tts_engine = pyttsx3.init()
-        self.tts_engine.setProperty('rate', 150)  # Speed of speech
-        self.tts_engine.setProperty('volume', 0.9)  # Volume (0-1)
+# Report sections in order, with the text used when a section is missing
+_FIELDS = ("terrain_description", "response_plan", "safety_notes", "recommended_actions")
+DEFAULTS = {
+    "terrain_description": "No terrain analysis available",
+    "response_plan": "No response plan available",
+    "safety_notes": "No safety notes available",
+    "recommended_actions": "No recommended actions available",
+}
 
-    def format_report(self, data: Dict[str, Any]) -> str:
-        """Format the analysis data into a readable report."""
-        report = f"""
+_REPORT_TEMPLATE = """
 DISASTER RESPONSE FIELD REPORT
 =============================
 
 TERRAIN ANALYSIS:
 ----------------
-{data.get('terrain_description', 'No terrain analysis available')}
+{}
 
 PLANNED RESPONSE:
 ----------------
-{data.get('response_plan', 'No response plan available')}
+{}
 
 SAFETY CONSIDERATIONS:
 ---------------------
-{data.get('safety_notes', 'No safety notes available')}
+{}
 
 RECOMMENDED ACTIONS:
 -------------------
-{data.get('recommended_actions', 'No recommended actions available')}
+{}
 """
-        return report
+
+class TextProcessor:
+    def __init__(self):
+        # The TTS engine probes the OS speech subsystem, so start it on first use
+        self.tts_engine = None
+        # A single worker keeps the (not thread-safe) engine off the UI thread
+        self._tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        self._cache_dir = Path(tempfile.gettempdir()) / "tts_cache"
+
+    def _ensure_tts(self):
+        if self.tts_engine is None:
+            import pyttsx3
+            self.tts_engine = pyttsx3.init()
+            self.tts_engine.setProperty('rate', 150)  # Speed of speech
+            self.tts_engine.setProperty('volume', 0.9)  # Volume (0-1)
+
+    def format_report(self, data: Dict[str, Any]) -> str:
+        """Format the analysis data into a readable report."""
+        merged = {**DEFAULTS, **data}
+        return _REPORT_TEMPLATE.format(*(merged[field] for field in _FIELDS))
 
     def text_to_speech(self, text: str, output_file: str = None):
         """Convert text to speech and optionally save to file."""
+        # On the TTS worker, like synth_async, so the engine is only ever used from one thread
+        self._tts_executor.submit(self._speak, text, output_file).result()
+
+    def _speak(self, text: str, output_file: str = None):
+        self._ensure_tts()
         if output_file:
             self.tts_engine.save_to_file(text, output_file)
             self.tts_engine.runAndWait()
@@ -41,13 +70,35 @@ RECOMMENDED ACTIONS:
             self.tts_engine.say(text)
             self.tts_engine.runAndWait()
 
+    def synth_async(self, text: str) -> Future:
+        """Synthesize text to a WAV file in the background; resolves to the file path.
+
+        Files are cached by a hash of the text, so repeat requests return at once.
+        """
+        key = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        path = self._cache_dir / f"{key}.wav"
+        if path.exists():
+            future = Future()
+            future.set_result(path)
+            return future
+        return self._tts_executor.submit(self._synth_to_file, text, path)
+
+    def _synth_to_file(self, text: str, path: Path) -> Path:
+        self._ensure_tts()
+        self._cache_dir.mkdir(exist_ok=True)
+        # Write under a temporary name so a half-written file is never served from the cache
+        partial = path.with_suffix(".partial.wav")
+        self.tts_engine.save_to_file(text, str(partial))
+        self.tts_engine.runAndWait()
+        partial.replace(path)
+        return path
+
     def save_report(self, report: str, filename: str):
         """Save the report to a JSON file."""
         data = {
             "report": report,
-            "timestamp": "2024-05-27T11:00:00Z",  # This should be dynamic in production
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "version": "1.0"
         }
         
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2) 
\ No newline at end of file
+        Path(filename).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2)) 
\ No newline at end of file
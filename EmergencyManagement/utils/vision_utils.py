@@ -4,25 +4,96 @@ from PIL import Image
 import torch
 from ultralytics import YOLO
 import os
+import sys
 import logging
-import gc
+import atexit
+import shutil
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # Set up logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Let cuDNN pick the fastest kernels for the fixed 640x640 input; TF32
+# speeds up the PyTorch fallback when no TensorRT engine is built
+if torch.cuda.is_available():
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+
+YOLO_WEIGHTS = "yolov8x.pt"  # Using YOLOv8x for best accuracy
+
+# TensorRT engines by precision, in the order VisionProcessor prefers them
+YOLO_ENGINES = {
+    "int8": "yolov8x-int8.engine",
+    "fp16": "yolov8x.engine",
+}
+
+# Largest batch the TensorRT engine accepts (one batch per analyzed scene)
+ENGINE_MAX_BATCH = 4
+
+def build_engine(precision="fp16", data="coco.yaml"):
+    """Export YOLO_WEIGHTS to a TensorRT engine; VisionProcessor loads it instead when present.
+    
+    INT8 engines are calibrated on the images of the dataset YAML in data,
+    which should hold scenes like the ones being analyzed. Before relying
+    on one, compare YOLO(engine).val(data=...) against the FP16 engine on
+    the classes that matter here (person, car, truck, building, fire,
+    smoke); keep the FP16 engine around as the fallback.
+    
+    Run once per machine (python -m utils.vision_utils [fp16|int8] [data]),
+    since engines are built for the GPU and TensorRT version they are
+    exported on.
+    """
+    int8 = precision == "int8"
+    target = YOLO_ENGINES[precision]
+    weights = YOLO(YOLO_WEIGHTS).ckpt_path  # downloads the weights if needed
+    # Ultralytics writes the engine (and its ONNX) next to the weights, named after
+    # them; export from a copy named after the target so other engines are untouched
+    with tempfile.TemporaryDirectory() as workdir:
+        copy = shutil.copy(weights, os.path.join(workdir, os.path.splitext(target)[0] + ".pt"))
+        exported = YOLO(copy).export(format="engine", half=not int8, int8=int8, data=data if int8 else None,
+                                     imgsz=640, device=0, workspace=8 if int8 else 4,
+                                     dynamic=True, batch=ENGINE_MAX_BATCH)
+        shutil.move(exported, target)
+    return target
+
+@lru_cache(maxsize=None)
+def _nvml_device():
+    """NVML handle of GPU 0; NVML is initialized once per process and shut down at exit."""
+    import pynvml
+    pynvml.nvmlInit()
+    atexit.register(pynvml.nvmlShutdown)
+    return pynvml.nvmlDeviceGetHandleByIndex(0)
+
 def get_gpu_info():
-    """Get detailed GPU information using nvidia-smi."""
+    """Get GPU utilization and memory through NVML, falling back to nvidia-smi without pynvml."""
+    try:
+        import pynvml
+    except ImportError:
+        try:
+            result = subprocess.run(['nvidia-smi'], capture_output=True, text=True)
+            return result.stdout
+        except Exception as e:
+            return f"Error getting GPU info: {str(e)}"
     try:
-        result = subprocess.run(['nvidia-smi'], capture_output=True, text=True)
-        return result.stdout
+        handle = _nvml_device()
+        util = pynvml.nvmlDeviceGetUtilizationRates(handle)
+        mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
+        return (f"GPU utilization: {util.gpu}%, memory utilization: {util.memory}%, "
+                f"memory used: {mem.used / 1024**2:.0f} / {mem.total / 1024**2:.0f} MB")
     except Exception as e:
         return f"Error getting GPU info: {str(e)}"
 
 def print_gpu_utilization():
     """Print current GPU utilization."""
-    if torch.cuda.is_available():
+    if not torch.cuda.is_available():
+        logger.warning("CUDA is not available. Running on CPU.")
+    elif logger.isEnabledFor(logging.INFO):
         logger.info(f"CUDA Device: {torch.cuda.get_device_name(0)}")
         logger.info(f"CUDA Version: {torch.version.cuda}")
         logger.info(f"Current GPU Memory: {torch.cuda.memory_allocated(0) / 1024**2:.2f} MB")
@@ -30,33 +101,98 @@ def print_gpu_utilization():
         logger.info(f"GPU Memory Cached: {torch.cuda.memory_reserved(0) / 1024**2:.2f} MB")
         logger.info("\nDetailed GPU Info:")
         logger.info(get_gpu_info())
-    else:
-        logger.warning("CUDA is not available. Running on CPU.")
+
+# Decode-time downscaling, largest factor first; JPEGs are decoded straight at the reduced size
+_REDUCED_READS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+def load_image(image_path, max_size=640):
+    """Read an image and resize it to fit max_size while maintaining aspect ratio, as RGB."""
+    # Pick the largest reduction that still leaves the long side at least max_size;
+    # PIL only reads the header here
+    flag = cv2.IMREAD_COLOR
+    try:
+        with Image.open(image_path) as probe:
+            long_side = max(probe.size)
+        flag = next((reduced for factor, reduced in _REDUCED_READS if long_side // factor >= max_size), flag)
+    except OSError:
+        pass  # cv2 reports unreadable files below
+    image = cv2.imread(image_path, flag)
+    if image is None:
+        raise ValueError(f"Could not load image from {image_path}")
+    
+    # Resize image for faster processing; area averaging when shrinking avoids aliasing
+    h, w = image.shape[:2]
+    scale = min(max_size / w, max_size / h)
+    new_size = (int(w * scale), int(h * scale))
+    image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def to_batch_tensor(images, device, size=640):
+    """Stack RGB images into a (N, 3, size, size) float tensor in [0, 1] on device.
+    
+    The uint8 pixels go up through pinned memory and are transposed to CHW
+    and scaled on the device, so YOLO skips its own CPU letterbox and
+    normalization. Padding is on the bottom and right, which keeps box
+    coordinates in each image's own pixels.
+    """
+    batch = torch.empty((len(images), size, size, 3), dtype=torch.uint8, pin_memory=device.type == "cuda")
+    pack_images(batch, images)
+    return batch.to(device, non_blocking=True).permute(0, 3, 1, 2).float().div_(255)
+
+def pack_images(batch, images):
+    """Copy RGB images into the top-left of a uint8 (N, size, size, 3) tensor, padding the rest."""
+    # 114 is the gray ultralytics pads with
+    batch.fill_(114)
+    for i, image in enumerate(images):
+        h, w = image.shape[:2]
+        batch[i, :h, :w] = torch.from_numpy(image)
+
+# RGB box colors for different object types
+_COLOR_MAP = {
+    'person': (0, 255, 0),    # Green for people
+    'car': (0, 0, 255),       # Blue for vehicles
+    'truck': (0, 0, 255),
+    'bus': (0, 0, 255),
+    'building': (255, 0, 0),  # Red for structures
+    'house': (255, 0, 0),
+    'bridge': (255, 0, 0),
+    'fire': (255, 165, 0),    # Orange for hazards
+    'smoke': (255, 165, 0),
+    'debris': (255, 165, 0)
+}
+_DEFAULT_COLOR = (128, 128, 128)  # Gray for everything else
+
+# Terrain analysis bucket per detected class; anything else is an obstacle
+_CATEGORY = {
+    'person': 'people',
+    'human': 'people',
+    'car': 'vehicles',
+    'truck': 'vehicles',
+    'bus': 'vehicles',
+    'motorcycle': 'vehicles',
+    'building': 'structures',
+    'house': 'structures',
+    'bridge': 'structures',
+    'fire': 'hazards',
+    'smoke': 'hazards',
+    'debris': 'hazards'
+}
 
 def create_visualization(image, detections):
-    """Create visualization of detections."""
+    """Create visualization of detections on a copy of an RGB image."""
     vis_image = image.copy()
     
-    # Create a color map for different object types
-    color_map = {
-        'person': (0, 255, 0),    # Green for people
-        'car': (255, 0, 0),       # Blue for vehicles
-        'truck': (255, 0, 0),
-        'bus': (255, 0, 0),
-        'building': (0, 0, 255),  # Red for structures
-        'house': (0, 0, 255),
-        'bridge': (0, 0, 255),
-        'fire': (0, 165, 255),    # Orange for hazards
-        'smoke': (0, 165, 255),
-        'debris': (0, 165, 255)
-    }
+    # Pixel coordinates for every box in one conversion
+    boxes = np.asarray([det['bbox'] for det in detections], dtype=np.int32).tolist()
     
-    for det in detections:
-        class_name = det['class'].lower()
-        color = color_map.get(class_name, (128, 128, 128))  # Default to gray
+    for det, (x1, y1, x2, y2) in zip(detections, boxes):
+        color = _COLOR_MAP.get(det['class'].lower(), _DEFAULT_COLOR)
         
         # Draw bounding box
-        x1, y1, x2, y2 = map(int, det['bbox'])
         cv2.rectangle(vis_image, (x1, y1), (x2, y2), color, 2)
         
         # Add label
@@ -66,6 +202,14 @@ def create_visualization(image, detections):
     return vis_image
 
 class VisionProcessor:
+    """YOLOv8 object detection for scene images.
+    
+    PyTorch's caching allocator keeps the GPU memory of one inference for
+    the next, so the reserved memory shown by nvidia-smi stays high between
+    images on purpose. The cache is only emptied to recover from an
+    out-of-memory error.
+    """
+    
     def __init__(self):
         # Force CUDA initialization
         if torch.cuda.is_available():
@@ -86,18 +230,34 @@ class VisionProcessor:
             logger.warning("Falling back to CPU")
             self.device = torch.device("cpu")
 
+        # Half-precision detection on GPU; CPU kernels stay in FP32
+        self.half = self.device.type == "cuda"
+        # Precision of the loaded detector ("int8", "fp16" or "fp32") and whether it is a TensorRT engine
+        self.precision = "fp16" if self.half else "fp32"
+        self.tensorrt = False
+
+        # Input buffers reused by every batch: pinned host memory, uploaded on a
+        # side stream so the copy is not serialized behind other default-stream work
+        if self.device.type == "cuda":
+            self._host_buf = torch.empty((ENGINE_MAX_BATCH, 640, 640, 3), dtype=torch.uint8, pin_memory=True)
+            self._dev_buf = torch.empty_like(self._host_buf, device=self.device)
+            self._stream = torch.cuda.Stream()
+            self._uploaded = torch.cuda.Event()
+            self._buf_lock = threading.Lock()
+
         try:
-            logger.info("Loading YOLO model...")
-            # Load YOLO model with GPU acceleration
-            self.model = YOLO('yolov8x.pt')  # Using YOLOv8x for best accuracy
-            if torch.cuda.is_available():
-                self.model.to(self.device)
-            
-            # Enable CUDA optimizations
-            if torch.cuda.is_available():
-                torch.backends.cudnn.benchmark = True
-                torch.backends.cuda.matmul.allow_tf32 = True
-                torch.backends.cudnn.allow_tf32 = True
+            # Prefer a prebuilt TensorRT engine (see build_engine) on GPU
+            precision, engine = next(((name, path) for name, path in YOLO_ENGINES.items() if os.path.exists(path)), (None, None))
+            if self.device.type == "cuda" and engine:
+                logger.info(f"Loading TensorRT engine {engine}...")
+                self.model = YOLO(engine, task="detect")
+                self.precision, self.tensorrt = precision, True
+            else:
+                logger.info("Loading YOLO model...")
+                # Load YOLO model with GPU acceleration
+                self.model = YOLO(YOLO_WEIGHTS)
+                if torch.cuda.is_available():
+                    self.model.to(self.device)
             
             print_gpu_utilization()
             
@@ -107,79 +267,102 @@ class VisionProcessor:
 
     def process_image(self, image_path):
         """Process an image and return detections."""
+        return self.process_images([image_path])[0]
+
+    @torch.inference_mode()
+    def process_images(self, image_paths):
+        """Process several images in one YOLO batch and return detections for each."""
+        if not image_paths:
+            return []
         try:
-            logger.info(f"Processing image: {image_path}")
-            
-            # Clear GPU memory before processing
-            if self.device.type == "cuda":
-                torch.cuda.empty_cache()
-                gc.collect()
+            logger.info(f"Processing {len(image_paths)} image(s): {image_paths}")
             
-            # Load and preprocess image
-            logger.info("Loading image...")
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not load image from {image_path}")
-            
-            # Resize image for faster processing while maintaining aspect ratio
-            max_size = 640
-            h, w = image.shape[:2]
-            scale = min(max_size / w, max_size / h)
-            new_size = (int(w * scale), int(h * scale))
-            image = cv2.resize(image, new_size)
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            # Load and preprocess images; OpenCV releases the GIL while decoding and resizing
+            logger.info("Loading images...")
+            with ThreadPoolExecutor(max_workers=min(len(image_paths), 4), thread_name_prefix="image-load") as pool:
+                images = list(pool.map(load_image, image_paths))
             
             logger.info("Running YOLO detection...")
-            # Run YOLO detection with optimized settings
-            results = self.model(
-                image,
-                conf=0.25,  # Confidence threshold
-                iou=0.45,   # NMS IoU threshold
-                max_det=50, # Maximum detections
-                verbose=False
-            )
-            
-            # Process detections
-            logger.info("Processing detections...")
-            detections = results[0].boxes.data.cpu().numpy()
-            
-            objects_detected = []
-            for det in detections:
-                x1, y1, x2, y2, conf, cls = det
-                class_name = results[0].names[int(cls)]
-                objects_detected.append({
-                    'class': class_name,
-                    'confidence': float(conf),
-                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                    'area_m2': (float(x2) - float(x1)) * (float(y2) - float(y1)) * 0.0001
-                })
-            
-            # Create visualization
-            logger.info("Creating visualization...")
-            visualization = create_visualization(image, objects_detected)
-            
-            # Convert visualization to RGB for display
-            visualization = cv2.cvtColor(visualization, cv2.COLOR_BGR2RGB)
-            
-            # Clear GPU memory after processing
-            if self.device.type == "cuda":
-                torch.cuda.empty_cache()
-                gc.collect()
+            results = self._detect(self._to_batch(images))
             
-            logger.info(f"Processing complete. Detected {len(objects_detected)} objects.")
-            return {
-                "detections": objects_detected,
-                "visualization": visualization,
-                "image": image
-            }
+            processed = [self._process_result(image, result) for image, result in zip(images, results)]
+            logger.info(f"Processing complete. Detected {sum(len(r['detections']) for r in processed)} objects.")
+            return processed
             
         except Exception as e:
-            logger.error(f"Error in process_image: {str(e)}")
+            logger.error(f"Error in process_images: {str(e)}")
             logger.error(f"Error details: {type(e).__name__}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
+    def _to_batch(self, images):
+        """Upload images as a YOLO input batch through the preallocated buffers."""
+        if self.device.type != "cuda" or len(images) > ENGINE_MAX_BATCH:
+            return to_batch_tensor(images, self.device)
+        with self._buf_lock:
+            host = self._host_buf[:len(images)]
+            device_batch = self._dev_buf[:len(images)]
+            # The previous upload must have left the host buffer before it is refilled
+            self._uploaded.synchronize()
+            pack_images(host, images)
+            with torch.cuda.stream(self._stream):
+                # ...and the previous batch's conversion must have read the device buffer
+                self._stream.wait_stream(torch.cuda.current_stream())
+                device_batch.copy_(host, non_blocking=True)
+                self._uploaded.record(self._stream)
+            torch.cuda.current_stream().wait_stream(self._stream)
+            return device_batch.permute(0, 3, 1, 2).float().div_(255)
+
+    def _process_result(self, image, result):
+        """Turn one image's YOLO result into detections and a visualization."""
+        detections = result.boxes.data.cpu().numpy()
+        
+        # Rows are x1, y1, x2, y2, confidence, class; convert whole columns at once
+        boxes = detections[:, :4]
+        wide = boxes.astype(np.float64)  # areas in double precision, as with Python floats
+        areas = ((wide[:, 2] - wide[:, 0]) * (wide[:, 3] - wide[:, 1]) * 0.0001).tolist()
+        names = result.names
+        objects_detected = [
+            {
+                'class': names[cls],
+                'confidence': conf,
+                'bbox': bbox,
+                'area_m2': area
+            }
+            for cls, conf, bbox, area in zip(
+                detections[:, 5].astype(int).tolist(), detections[:, 4].tolist(), boxes.tolist(), areas
+            )
+        ]
+        
+        # Create visualization (drawn in RGB, ready for display)
+        visualization = create_visualization(image, objects_detected)
+        
+        return {
+            "detections": objects_detected,
+            "visualization": visualization,
+            "image": image
+        }
+
+    def _detect(self, images):
+        """Run YOLO detection on a batch, retrying once with an emptied CUDA cache if the GPU runs out of memory."""
+        for attempt in range(2):
+            try:
+                # Run YOLO detection with optimized settings
+                return self.model(
+                    images,
+                    conf=0.25,  # Confidence threshold
+                    iou=0.45,   # NMS IoU threshold
+                    max_det=50, # Maximum detections
+                    half=self.half,
+                    verbose=False
+                )
+            except torch.cuda.OutOfMemoryError:
+                if attempt:
+                    raise
+                logger.warning("CUDA out of memory during detection; emptying the cache and retrying")
+                torch.cuda.empty_cache()
+    
     def analyze_terrain(self, image_path):
         """Analyze terrain and return detailed description."""
         try:
@@ -198,17 +381,7 @@ class VisionProcessor:
             # Process detections
             logger.info("Categorizing detections...")
             for det in results["detections"]:
-                class_name = det["class"].lower()
-                if class_name in ["person", "human"]:
-                    terrain_analysis["people"].append(det)
-                elif class_name in ["car", "truck", "bus", "motorcycle"]:
-                    terrain_analysis["vehicles"].append(det)
-                elif class_name in ["building", "house", "bridge"]:
-                    terrain_analysis["structures"].append(det)
-                elif class_name in ["fire", "smoke", "debris"]:
-                    terrain_analysis["hazards"].append(det)
-                else:
-                    terrain_analysis["obstacles"].append(det)
+                terrain_analysis[_CATEGORY.get(det["class"].lower(), "obstacles")].append(det)
             
             logger.info("Terrain analysis complete")
             return {
@@ -222,4 +395,7 @@ class VisionProcessor:
             logger.error(f"Error details: {type(e).__name__}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
-            raise 
\ No newline at end of file
+            raise
+
+if __name__ == "__main__":
+    print(f"TensorRT engine written to {build_engine(*sys.argv[1:3])}")
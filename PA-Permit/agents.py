@@ -2,11 +2,76 @@
 CrewAI Agent Definitions for PA Permit Automation
 Defines specialized agents for permit processing workflow
 """
-from crewai import Agent, Task, Crew, LLM
-from typing import Dict, Any, List
-from config import Config
+import asyncio
+import re
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Literal, Optional
+from pydantic import BaseModel
+from config import Config, DecisionStatus
 from mcp_server import mcp_server
 
+if TYPE_CHECKING:
+    from crewai import LLM, Agent, Task
+
+
+# Structured stage outputs; CrewAI asks the model for JSON in these shapes
+class IntakeResult(BaseModel):
+    status: Literal["COMPLETE", "INCOMPLETE"]
+    reasoning: str
+
+
+class ReviewResult(BaseModel):
+    has_concerns: bool
+    findings: str
+
+
+class ComplianceResult(BaseModel):
+    status: Literal["COMPLIANT", "CONDITIONAL", "NON-COMPLIANT"]
+    report: str
+
+
+class DecisionResult(BaseModel):
+    decision: Literal["APPROVED", "APPROVED WITH CONDITIONS", "DENIED", "MORE INFORMATION NEEDED"]
+    rationale: str
+
+
+# Receives a stage's reply text as the model streams it
+TokenCallback = Callable[[str], None]
+
+# Token callback per streaming LLM, keyed by id(llm). Each stage has its own LLM
+# instance, which CrewAI passes as the event source; CrewAI 1.x runs handlers on
+# its own thread pool, so the calling thread cannot identify the stage
+_stream_sinks: Dict[int, TokenCallback] = {}
+_stream_listener_lock = threading.Lock()
+_stream_listener_installed = False
+
+
+def _install_stream_listener() -> bool:
+    """Forward CrewAI LLM stream chunks to the token callback of the stage whose LLM sent them"""
+    global _stream_listener_installed
+    with _stream_listener_lock:
+        if not _stream_listener_installed:
+            try:
+                from crewai.events import crewai_event_bus
+                from crewai.events.types.llm_events import LLMStreamChunkEvent
+            except ImportError:
+                try:
+                    # CrewAI before 1.0
+                    from crewai.utilities.events import crewai_event_bus
+                    from crewai.utilities.events.llm_events import LLMStreamChunkEvent
+                except ImportError:
+                    # Older CrewAI without stream events; stages just return when done
+                    return False
+            
+            @crewai_event_bus.on(LLMStreamChunkEvent)
+            def _forward_chunk(source, event):
+                on_token = _stream_sinks.get(id(source))
+                if on_token is not None:
+                    on_token(event.chunk)
+            
+            _stream_listener_installed = True
+    return True
+
 
 class PermitAgentSystem:
     """
@@ -14,21 +79,82 @@ class PermitAgentSystem:
     Implements A2A handoff pattern with MCP context management
     """
     
+    # Verdict keywords, matched at word starts in one pass over the agent's output;
+    # only used when a model reply does not parse into the stage's result model
+    _COMPLETE_RE = re.compile(
+        r"\b(complete|sufficient|adequate|ready for technical review|all required information|no missing items)",
+        re.IGNORECASE
+    )
+    _INCOMPLETE_RE = re.compile(
+        r"\b(missing|incomplete|insufficient|additional information required|need more|lacks)",
+        re.IGNORECASE
+    )
+    _CONCERN_RE = re.compile(r"\b(concern|risk|issue|problem)", re.IGNORECASE)
+    _COMPLIANCE_RE = re.compile(
+        r"\b(?:(?P<non_compliant>non-?compliant)|(?P<conditional>conditional)|(?P<compliant>compliant))",
+        re.IGNORECASE
+    )
+    _DECISION_RE = re.compile(
+        r"\b(?:(?P<conditions>approved with conditions)|(?P<approved>approved)|(?P<denied>denied))",
+        re.IGNORECASE
+    )
+    
+    # Canned results for "Perfect" demo applications, whose outcome is fixed
+    _PERFECT_REVIEW_TEXT = (
+        "Technical review: this application demonstrates best practices. The technology is "
+        "feasible and innovative, the zero-impact design brings positive environmental "
+        "benefits, safety protocols are comprehensive, and the project exceeds PA regulations. "
+        "No concerns identified."
+    )
+    _PERFECT_COMPLIANCE_TEXT = (
+        "Compliance verification: the application exceeds Pennsylvania DEP regulations, federal "
+        "EPA requirements, local zoning and land use rules, industry-specific standards and "
+        "environmental protection laws. Compliance status: COMPLIANT"
+    )
+    _PERFECT_DECISION_TEXT = (
+        "Decision: APPROVED (full approval without conditions). The application has zero "
+        "concerns, is fully compliant with all regulations, exceeds all requirements and "
+        "represents best practices."
+    )
+    
     def __init__(self):
-        # Configure LLM for CrewAI using ollama/ prefix
-        model_name = Config.OLLAMA_MODEL
+        from crewai import Crew
+        
+        # Small model for the checklist-style stages, large one for the decision;
+        # one LLM instance per stage so stream chunks can be routed back to it
+        self.llms = {
+            stage: self._create_llm(Config.OLLAMA_MODEL_HEAVY if stage == "decision" else Config.OLLAMA_MODEL_FAST)
+            for stage in ("intake", "review", "compliance", "decision")
+        }
+        self.agents = self._create_agents()
+        
+        # One crew per stage, reused with each call's task; the lock keeps
+        # concurrent applications from swapping a crew's task mid-run
+        self._crews = {
+            name: Crew(agents=[agent], tasks=[], verbose=Config.DEBUG_MODE)
+            for name, agent in self.agents.items()
+        }
+        self._crew_locks = {name: threading.Lock() for name in self.agents}
+        self._streaming = _install_stream_listener()
+        
+    @staticmethod
+    def _create_llm(model_name: str) -> "LLM":
+        """Configure LLM for CrewAI using ollama/ prefix"""
+        from crewai import LLM
+        
         # CrewAI expects format: ollama/model:tag
         if not model_name.startswith('ollama/'):
             model_name = f"ollama/{model_name}"
         
-        self.llm = LLM(
+        return LLM(
             model=model_name,
-            base_url=Config.OLLAMA_BASE_URL
+            base_url=Config.OLLAMA_BASE_URL,
+            stream=True
         )
-        self.agents = self._create_agents()
-        
-    def _create_agents(self) -> Dict[str, Agent]:
+    
+    def _create_agents(self) -> Dict[str, "Agent"]:
         """Create specialized agents for permit workflow"""
+        from crewai import Agent
         
         # Agent 1: Intake Specialist
         intake_agent = Agent(
@@ -39,9 +165,9 @@ class PermitAgentSystem:
             applications, validate required information, identify missing data, 
             and prepare applications for technical review. You have deep knowledge 
             of PA permit requirements and forms.""",
-            verbose=True,
+            verbose=Config.DEBUG_MODE,
             allow_delegation=True,
-            llm=self.llm
+            llm=self.llms["intake"]
         )
         
         # Agent 2: Technical Review Officer
@@ -53,9 +179,9 @@ class PermitAgentSystem:
             analyze permit applications for technical merit, environmental impact, 
             safety compliance, and regulatory adherence. You identify potential 
             issues and provide detailed technical assessments.""",
-            verbose=True,
+            verbose=Config.DEBUG_MODE,
             allow_delegation=True,
-            llm=self.llm
+            llm=self.llms["review"]
         )
         
         # Agent 3: Compliance Verification Agent
@@ -67,9 +193,9 @@ class PermitAgentSystem:
             DEP requirements, and agricultural regulations. You cross-check 
             applications against all applicable regulations, identify compliance 
             gaps, and ensure legal requirements are met.""",
-            verbose=True,
+            verbose=Config.DEBUG_MODE,
             allow_delegation=True,
-            llm=self.llm
+            llm=self.llms["compliance"]
         )
         
         # Agent 4: Decision Authority
@@ -81,9 +207,9 @@ class PermitAgentSystem:
             compliance reports, and risk assessments to make final permit decisions. 
             You provide clear rationale for approvals, denials, or requests for 
             additional information.""",
-            verbose=True,
+            verbose=Config.DEBUG_MODE,
             allow_delegation=False,
-            llm=self.llm
+            llm=self.llms["decision"]
         )
         
         return {
@@ -93,8 +219,29 @@ class PermitAgentSystem:
             "decision": decision_agent
         }
     
-    def _intake_stage(self, app_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _is_perfect(context: Dict[str, Any]) -> bool:
+        """Whether this is a "Perfect" demo application with a fixed approval"""
+        return 'perfect' in context.get('applicant_name', '').lower()
+    
+    def _run_task(self, stage: str, task: "Task", on_token: Optional[TokenCallback] = None) -> Any:
+        """Run a task on the stage's cached crew, passing reply text to on_token as it streams"""
+        with self._crew_locks[stage]:
+            crew = self._crews[stage]
+            crew.tasks = [task]
+            # The crew lock makes this stage the only user of its LLM, hence of the key
+            key = id(self.llms[stage])
+            if self._streaming and on_token is not None:
+                _stream_sinks[key] = on_token
+            try:
+                return crew.kickoff()
+            finally:
+                _stream_sinks.pop(key, None)
+    
+    def _intake_stage(self, app_id: str, data: Dict[str, Any], on_token: Optional[TokenCallback] = None) -> Dict[str, Any]:
         """Execute intake review stage"""
+        from crewai import Task
+        
         mcp_server.set_application_state(app_id, "intake", "in_review", "intake")
         
         task = Task(
@@ -123,177 +270,139 @@ class PermitAgentSystem:
             Provide your assessment and clearly state: COMPLETE or INCOMPLETE
             """,
             agent=self.agents["intake"],
-            expected_output="A detailed assessment clearly stating COMPLETE or INCOMPLETE with reasoning"
+            expected_output="The status COMPLETE or INCOMPLETE and brief reasoning",
+            output_pydantic=IntakeResult
         )
         
-        crew = Crew(agents=[self.agents["intake"]], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        
-        # Analyze result to determine completeness with better logic
-        result_text = str(result).lower()
-        
-        # Check for positive indicators of completeness
-        complete_indicators = [
-            "complete",
-            "sufficient",
-            "adequate", 
-            "ready for technical review",
-            "all required information",
-            "no missing items"
-        ]
-        
-        # Check for negative indicators
-        incomplete_indicators = [
-            "missing",
-            "incomplete", 
-            "insufficient",
-            "additional information required",
-            "need more",
-            "lacks"
-        ]
-        
-        # Count positive vs negative indicators
-        positive_count = sum(1 for indicator in complete_indicators if indicator in result_text)
-        negative_count = sum(1 for indicator in incomplete_indicators if indicator in result_text)
-        
-        # Determine completeness based on balance of indicators
-        complete = positive_count > negative_count or (positive_count > 0 and negative_count == 0)
+        result = self._run_task("intake", task, on_token)
+        
+        if result.pydantic is not None:
+            complete = result.pydantic.status == "COMPLETE"
+            notes = result.pydantic.reasoning
+        else:
+            # Analyze result to determine completeness with better logic
+            notes = str(result)
+            
+            # Count the distinct positive vs negative indicators present
+            positive_count = len({match.lower() for match in self._COMPLETE_RE.findall(notes)})
+            negative_count = len({match.lower() for match in self._INCOMPLETE_RE.findall(notes)})
+            
+            # Determine completeness based on balance of indicators
+            complete = positive_count > negative_count or (positive_count > 0 and negative_count == 0)
         
         mcp_server.add_decision(
             app_id, 
             "intake", 
             "COMPLETE" if complete else "INCOMPLETE",
-            str(result)
+            notes
         )
         
         return {
             "complete": complete,
-            "notes": str(result),
+            "notes": notes,
             "agent": "intake"
         }
     
-    def _review_stage(self, app_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _review_stage(self, app_id: str, context: Dict[str, Any], on_token: Optional[TokenCallback] = None) -> Dict[str, Any]:
         """Execute technical review stage"""
+        from crewai import Task
+        
         mcp_server.set_application_state(app_id, "review", "in_review", "review")
         
-        # Check if this is a "Perfect" application that should get no concerns
-        applicant_name = context.get('applicant_name', '')
-        is_perfect_app = 'Perfect' in applicant_name or 'perfect' in applicant_name.lower()
-        
-        if is_perfect_app:
-            task = Task(
-                description=f"""Conduct technical review of this EXCEPTIONAL permit application:
-                
-                Permit Type: {context.get('permit_type', 'N/A')}
-                Project: {context.get('project_description', 'N/A')}
-                
-                This is a PREMIUM application with cutting-edge technology and zero-impact design.
-                
-                Analyze:
-                1. Technical feasibility - Focus on the advanced technology and innovation
-                2. Environmental impact - Highlight the positive environmental benefits
-                3. Safety measures - Note the comprehensive safety protocols
-                4. Regulatory alignment - Emphasize how it exceeds PA regulations
-                
-                This application represents BEST PRACTICES and should be praised for its excellence.
-                """,
-                agent=self.agents["review"],
-                expected_output="A positive technical review highlighting the exceptional quality"
-            )
-        else:
-            task = Task(
-                description=f"""Conduct technical review of this permit application:
-                
-                Permit Type: {context.get('permit_type', 'N/A')}
-                Project: {context.get('project_description', 'N/A')}
-                
-                Analyze:
-                1. Technical feasibility
-                2. Environmental impact considerations
-                3. Safety measures
-                4. Potential risks or concerns
-                5. Alignment with PA regulations
-                
-                Provide a detailed technical assessment.
-                """,
-                agent=self.agents["review"],
-                expected_output="A comprehensive technical review report"
-            )
-        
-        crew = Crew(agents=[self.agents["review"]], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        
-        # Check for any red flags (skip for perfect applications)
-        if is_perfect_app:
-            has_concerns = False  # Perfect applications get no concerns
+        # Perfect applications get no concerns, so skip the LLM
+        if self._is_perfect(context):
+            return {
+                "findings": self._PERFECT_REVIEW_TEXT,
+                "has_concerns": False,
+                "agent": "review"
+            }
+        
+        task = Task(
+            description=f"""Conduct technical review of this permit application:
+            
+            Permit Type: {context.get('permit_type', 'N/A')}
+            Project: {context.get('project_description', 'N/A')}
+            
+            Analyze:
+            1. Technical feasibility
+            2. Environmental impact considerations
+            3. Safety measures
+            4. Potential risks or concerns
+            5. Alignment with PA regulations
+            
+            Provide a detailed technical assessment.
+            """,
+            agent=self.agents["review"],
+            expected_output="Whether there are technical concerns and the technical review findings",
+            output_pydantic=ReviewResult
+        )
+        
+        result = self._run_task("review", task, on_token)
+        
+        if result.pydantic is not None:
+            has_concerns = result.pydantic.has_concerns
+            findings = result.pydantic.findings
         else:
-            has_concerns = any(word in str(result).lower() for word in ["concern", "risk", "issue", "problem"])
+            # Check for any red flags
+            findings = str(result)
+            has_concerns = self._CONCERN_RE.search(findings) is not None
         
         if has_concerns:
             mcp_server.add_flag(app_id, "technical", "Technical concerns identified", "medium")
         
         return {
-            "findings": str(result),
+            "findings": findings,
             "has_concerns": has_concerns,
             "agent": "review"
         }
     
-    def _compliance_stage(self, app_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _compliance_stage(self, app_id: str, context: Dict[str, Any], on_token: Optional[TokenCallback] = None) -> Dict[str, Any]:
         """Execute compliance verification stage"""
+        from crewai import Task
+        
         mcp_server.set_application_state(app_id, "compliance", "in_review", "compliance")
         
         permit_type = context.get('permit_type', '')
-        applicant_name = context.get('applicant_name', '')
-        is_perfect_app = 'Perfect' in applicant_name or 'perfect' in applicant_name.lower()
-        
-        if is_perfect_app:
-            task = Task(
-                description=f"""Verify regulatory compliance for this EXCEPTIONAL {permit_type}:
-                
-                This is a PREMIUM application that EXCEEDS all regulatory requirements.
-                
-                Compliance verification:
-                1. Pennsylvania DEP regulations - This application exceeds all standards
-                2. Federal EPA requirements - Demonstrates best practices and innovation
-                3. Local zoning and land use - Fully compliant with enhanced environmental protection
-                4. Industry-specific standards - Represents cutting-edge technology
-                5. Environmental protection laws - Goes beyond minimum requirements
-                
-                This application should receive FULL COMPLIANT status as it exceeds all requirements.
-                Provide compliance status: COMPLIANT
-                """,
-                agent=self.agents["compliance"],
-                expected_output="A positive compliance verification report confirming full compliance"
-            )
-        else:
-            task = Task(
-                description=f"""Verify regulatory compliance for this {permit_type}:
-                
-                Check compliance with:
-                1. Pennsylvania DEP regulations
-                2. Federal EPA requirements (if applicable)
-                3. Local zoning and land use requirements
-                4. Industry-specific standards
-                5. Environmental protection laws
-                
-                Identify any compliance gaps or violations.
-                Provide compliance status: COMPLIANT, CONDITIONAL, or NON-COMPLIANT
-                """,
-                agent=self.agents["compliance"],
-                expected_output="A detailed compliance verification report with status"
-            )
-        
-        crew = Crew(agents=[self.agents["compliance"]], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        
-        # Determine compliance status (Perfect apps are always COMPLIANT)
-        if is_perfect_app:
-            status = "COMPLIANT"
+        
+        # Perfect applications are always COMPLIANT, so skip the LLM
+        if self._is_perfect(context):
+            mcp_server.add_decision(app_id, "compliance", "COMPLIANT", self._PERFECT_COMPLIANCE_TEXT)
+            return {
+                "status": "COMPLIANT",
+                "report": self._PERFECT_COMPLIANCE_TEXT,
+                "agent": "compliance"
+            }
+        
+        task = Task(
+            description=f"""Verify regulatory compliance for this {permit_type}:
+            
+            Check compliance with:
+            1. Pennsylvania DEP regulations
+            2. Federal EPA requirements (if applicable)
+            3. Local zoning and land use requirements
+            4. Industry-specific standards
+            5. Environmental protection laws
+            
+            Identify any compliance gaps or violations.
+            Provide compliance status: COMPLIANT, CONDITIONAL, or NON-COMPLIANT
+            """,
+            agent=self.agents["compliance"],
+            expected_output="The compliance status and a compliance verification report",
+            output_pydantic=ComplianceResult
+        )
+        
+        result = self._run_task("compliance", task, on_token)
+        
+        if result.pydantic is not None:
+            status = result.pydantic.status
+            report = result.pydantic.report
         else:
-            result_lower = str(result).lower()
-            if "compliant" in result_lower and "non" not in result_lower:
+            # Determine compliance status
+            report = str(result)
+            found = {match.lastgroup for match in self._COMPLIANCE_RE.finditer(report)}
+            if "compliant" in found and "non_compliant" not in found:
                 status = "COMPLIANT"
-            elif "conditional" in result_lower:
+            elif "conditional" in found:
                 status = "CONDITIONAL"
             else:
                 status = "NON-COMPLIANT"
@@ -301,94 +410,139 @@ class PermitAgentSystem:
         if status == "NON-COMPLIANT":
             mcp_server.add_flag(app_id, "compliance", "Compliance violations identified", "high")
         
-        mcp_server.add_decision(app_id, "compliance", status, str(result))
+        mcp_server.add_decision(app_id, "compliance", status, report)
         
         return {
             "status": status,
-            "report": str(result),
+            "report": report,
             "agent": "compliance"
         }
     
-    def _decision_stage(self, app_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _decision_stage(self, app_id: str, context: Dict[str, Any], on_token: Optional[TokenCallback] = None) -> Dict[str, Any]:
         """Execute final decision stage"""
+        from crewai import Task
+        
         mcp_server.set_application_state(app_id, "decision", "in_review", "decision")
         
+        # Perfect applications are always APPROVED, so skip the LLM
+        if self._is_perfect(context):
+            mcp_server.add_decision(app_id, "decision", DecisionStatus.APPROVED, self._PERFECT_DECISION_TEXT)
+            return {
+                "decision": DecisionStatus.APPROVED,
+                "rationale": self._PERFECT_DECISION_TEXT,
+                "agent": "decision"
+            }
+        
         # Get all previous decisions and flags
         app_state = mcp_server.get_application_state(app_id)
-        applicant_name = context.get('applicant_name', '')
-        is_perfect_app = 'Perfect' in applicant_name or 'perfect' in applicant_name.lower()
-        
-        if is_perfect_app:
-            task = Task(
-                description=f"""Make final permit decision for this EXCEPTIONAL application:
-                
-                Application Type: {context.get('permit_type', 'N/A')}
-                Intake Status: {context.get('intake_complete', False)}
-                Review Findings: {context.get('review_findings', 'N/A')}
-                Compliance Status: {context.get('compliance_status', 'N/A')}
-                
-                This is a PREMIUM application with:
-                - Zero concerns identified
-                - Full compliance with all regulations
-                - Exceeds all requirements
-                - Represents best practices
-                
-                Decision: APPROVED (Full approval without conditions)
-                
-                Provide rationale highlighting the exceptional quality of this application.
-                """,
-                agent=self.agents["decision"],
-                expected_output="A final decision of APPROVED with rationale highlighting excellence"
-            )
-        else:
-            task = Task(
-                description=f"""Make final permit decision based on all reviews:
-                
-                Application Type: {context.get('permit_type', 'N/A')}
-                Intake Status: {context.get('intake_complete', False)}
-                Review Findings: {context.get('review_findings', 'N/A')}
-                Compliance Status: {context.get('compliance_status', 'N/A')}
-                
-                Flags: {len(app_state.get('flags', []))} identified
-                
-                Provide ONE of the following decisions:
-                - APPROVED: Permit is approved
-                - APPROVED WITH CONDITIONS: Approved with specific conditions
-                - DENIED: Permit is denied
-                - MORE INFORMATION NEEDED: Requires additional information
-                
-                Provide clear rationale for your decision.
-                """,
-                agent=self.agents["decision"],
-                expected_output="A final permit decision with detailed rationale"
-            )
-        
-        crew = Crew(agents=[self.agents["decision"]], tasks=[task], verbose=True)
-        result = crew.kickoff()
-        
-        # Extract decision (Perfect apps always get APPROVED)
-        if is_perfect_app:
-            decision = "APPROVED"
+        
+        task = Task(
+            description=f"""Make final permit decision based on all reviews:
+            
+            Application Type: {context.get('permit_type', 'N/A')}
+            Intake Status: {context.get('intake_complete', False)}
+            Review Findings: {context.get('review_findings', 'N/A')}
+            Compliance Status: {context.get('compliance_status', 'N/A')}
+            
+            Flags: {len(app_state.get('flags', []))} identified
+            
+            Provide ONE of the following decisions:
+            - APPROVED: Permit is approved
+            - APPROVED WITH CONDITIONS: Approved with specific conditions
+            - DENIED: Permit is denied
+            - MORE INFORMATION NEEDED: Requires additional information
+            
+            Provide clear rationale for your decision.
+            """,
+            agent=self.agents["decision"],
+            expected_output="The final permit decision and its rationale",
+            output_pydantic=DecisionResult
+        )
+        
+        result = self._run_task("decision", task, on_token)
+        
+        if result.pydantic is not None:
+            decision = DecisionStatus(result.pydantic.decision)
+            rationale = result.pydantic.rationale
         else:
-            result_lower = str(result).lower()
-            if "approved with conditions" in result_lower:
-                decision = "APPROVED WITH CONDITIONS"
-            elif "approved" in result_lower:
-                decision = "APPROVED"
-            elif "denied" in result_lower:
-                decision = "DENIED"
+            # Extract decision
+            rationale = str(result)
+            found = {match.lastgroup for match in self._DECISION_RE.finditer(rationale)}
+            if "conditions" in found:
+                decision = DecisionStatus.APPROVED_WITH_CONDITIONS
+            elif "approved" in found:
+                decision = DecisionStatus.APPROVED
+            elif "denied" in found:
+                decision = DecisionStatus.DENIED
             else:
-                decision = "MORE INFORMATION NEEDED"
+                decision = DecisionStatus.MORE_INFORMATION_NEEDED
         
-        mcp_server.add_decision(app_id, "decision", decision, str(result))
+        mcp_server.add_decision(app_id, "decision", decision, rationale)
         
         return {
             "decision": decision,
-            "rationale": str(result),
+            "rationale": rationale,
             "agent": "decision"
         }
+    
+    async def _review_stage_async(self, app_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute technical review stage in a worker thread"""
+        return await asyncio.to_thread(self._review_stage, app_id, context)
+    
+    async def _compliance_stage_async(self, app_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute compliance verification stage in a worker thread"""
+        return await asyncio.to_thread(self._compliance_stage, app_id, context)
+    
+    async def process_application_async(self, app_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run all four stages for an application created with mcp_server.create_context
+        Review and compliance only depend on intake, so they run concurrently
+        """
+        result = {
+            "application_id": app_id,
+            "stages": {},
+            "final_decision": None
+        }
+        
+        intake_result = await asyncio.to_thread(self._intake_stage, app_id, data)
+        result["stages"]["intake"] = intake_result
+        if not intake_result["complete"]:
+            result["final_decision"] = DecisionStatus.INCOMPLETE
+            mcp_server.set_application_state(app_id, "stopped", result["final_decision"], "intake")
+            return result
+        
+        handoff = mcp_server.a2a_handoff(
+            app_id, "intake", "review",
+            {"intake_complete": True, "intake_notes": intake_result["notes"]}
+        )
+        review_result, compliance_result = await asyncio.gather(
+            self._review_stage_async(app_id, handoff["context"]),
+            self._compliance_stage_async(app_id, handoff["context"])
+        )
+        result["stages"]["review"] = review_result
+        result["stages"]["compliance"] = compliance_result
+        
+        handoff = mcp_server.batch_update(app_id, [
+            ("handoff", "review", "decision",
+             {"review_complete": True, "review_findings": review_result["findings"]}),
+            ("handoff", "compliance", "decision",
+             {"compliance_complete": True, "compliance_status": compliance_result["status"]})
+        ])
+        decision_result = await asyncio.to_thread(self._decision_stage, app_id, handoff["context"])
+        result["stages"]["decision"] = decision_result
+        result["final_decision"] = decision_result["decision"]
+        
+        mcp_server.set_application_state(app_id, "completed", result["final_decision"], "decision")
+        return result
+
+
+_instance = None
 
 
-# Global agent system instance
-agent_system = PermitAgentSystem()
+def get_agent_system() -> PermitAgentSystem:
+    """Shared agent system, created on first use so importing this module stays cheap"""
+    global _instance
+    if _instance is None:
+        _instance = PermitAgentSystem()
+    return _instance
 
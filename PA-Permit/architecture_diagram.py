@@ -1,8 +1,11 @@
 """
 Architecture Diagram Generator using Graphviz
 Creates visual representation of the PA Permit Automation System
+graphviz is imported by the generators, so importing this module stays cheap
 """
-import graphviz
+
+# Bump when either diagram changes; the app caches the graphs per version
+DIAGRAM_VERSION = "v1"
 
 
 def generate_architecture_diagram():
@@ -11,6 +14,8 @@ def generate_architecture_diagram():
     and their interactions
     """
     
+    import graphviz
+    
     # Create directed graph with Streamlit dark theme background color
     dot = graphviz.Digraph(comment='PA Permit Automation System Architecture')
     dot.attr(rankdir='TB', splines='ortho', nodesep='1.0', ranksep='1.5', size='18,14', bgcolor='#0E1117')
@@ -120,6 +125,7 @@ def generate_architecture_diagram():
 
 def generate_workflow_diagram():
     """Generate simplified workflow diagram"""
+    import graphviz
     
     dot = graphviz.Digraph(comment='Permit Processing Workflow')
     dot.attr(rankdir='LR', size='12,6', nodesep='1.0', ranksep='1.5', bgcolor='#0E1117')
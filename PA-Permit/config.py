@@ -2,10 +2,32 @@
 Configuration module for PA Permit Automation System
 """
 import os
+from enum import Enum
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+class DecisionStatus(str, Enum):
+    """Final outcome of a permit application; members compare and serialize as their text"""
+    APPROVED = "APPROVED"
+    APPROVED_WITH_CONDITIONS = "APPROVED WITH CONDITIONS"
+    DENIED = "DENIED"
+    MORE_INFORMATION_NEEDED = "MORE INFORMATION NEEDED"
+    INCOMPLETE = "INCOMPLETE - Additional information required"
+    
+    def __str__(self) -> str:
+        return self.value
+    
+    @property
+    def is_approval(self) -> bool:
+        return self in (DecisionStatus.APPROVED, DecisionStatus.APPROVED_WITH_CONDITIONS)
+    
+    @property
+    def needs_information(self) -> bool:
+        return self in (DecisionStatus.MORE_INFORMATION_NEEDED, DecisionStatus.INCOMPLETE)
+
+
 class Config:
     """Application configuration"""
     
@@ -13,10 +35,17 @@ class Config:
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral:latest")  # Using smaller model for better performance
     
+    # Model cascade: intake, review and compliance run on a small quantized model and
+    # the final decision on the heavy one. Set OLLAMA_MODEL_FAST to the heavy model to
+    # run every stage on a single model.
+    OLLAMA_MODEL_FAST = os.getenv("OLLAMA_MODEL_FAST", "llama3.2:3b-instruct-q4_K_M")
+    OLLAMA_MODEL_HEAVY = os.getenv("OLLAMA_MODEL_HEAVY", OLLAMA_MODEL)
+    
     # Application Settings
     APP_TITLE = os.getenv("APP_TITLE", "PA Permit Automation System")
     APP_PORT = int(os.getenv("APP_PORT", "8501"))
     DEBUG_MODE = os.getenv("DEBUG_MODE", "False").lower() == "true"
+    MAX_HISTORY = int(os.getenv("MAX_HISTORY", "50"))  # Processed applications kept per session
     
     # MCP Server Settings
     MCP_SERVER_HOST = os.getenv("MCP_SERVER_HOST", "localhost")
@@ -113,6 +113,19 @@ if command -v ollama &> /dev/null; then
         fi
     fi
     
+    # Check for the small model used by the intake, review and compliance agents
+    if echo "$AVAILABLE_MODELS" | grep -q "llama3.2:3b-instruct-q4_K_M" 2>/dev/null; then
+        echo -e "${GREEN}✓ llama3.2:3b-instruct-q4_K_M is already available${NC}"
+    else
+        echo -e "${YELLOW}Pulling llama3.2:3b-instruct-q4_K_M...${NC}"
+        if ollama pull llama3.2:3b-instruct-q4_K_M 2>/dev/null; then
+            echo -e "${GREEN}✓ llama3.2:3b-instruct-q4_K_M pulled successfully${NC}"
+        else
+            echo -e "${YELLOW}⚠ Failed to pull llama3.2:3b-instruct-q4_K_M (Ollama service may not be running)${NC}"
+            echo -e "${YELLOW}  You can pull it later with: ollama pull llama3.2:3b-instruct-q4_K_M${NC}"
+        fi
+    fi
+    
     # Also check for mixtral:latest (mentioned in run.py)
     if echo "$AVAILABLE_MODELS" | grep -q "mixtral:latest" 2>/dev/null; then
         echo -e "${GREEN}✓ mixtral:latest is already available${NC}"
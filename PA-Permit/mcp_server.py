@@ -2,9 +2,41 @@
 MCP Server for Context Management
 Model Context Protocol server for managing agent context and state
 """
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Any, Optional, Tuple
 import threading
+import time
+
+# Handoffs kept per application; older ones drop off first
+HISTORY_LIMIT = 256
+
+
+@dataclass(slots=True)
+class AppRecord:
+    """Context, state and handoff history of one application (times are epoch seconds)"""
+    created_at: float
+    updated_at: float
+    data: Dict[str, Any]
+    current_agent: Optional[str] = None
+    status: str = "initiated"
+    stage: str = "intake"
+    decisions: List[Dict[str, Any]] = field(default_factory=list)
+    flags: List[Dict[str, Any]] = field(default_factory=list)
+    documents: List[Dict[str, Any]] = field(default_factory=list)
+    history: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=HISTORY_LIMIT))
+    # Guards this record only, so different applications never wait on each other
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    
+    def state(self) -> Dict[str, Any]:
+        """Application state in the shape agents and the UI read (lists are copies)"""
+        return {
+            "stage": self.stage,
+            "decisions": list(self.decisions),
+            "flags": list(self.flags),
+            "documents": list(self.documents),
+            "updated_at": self.updated_at
+        }
 
 
 class MCPServer:
@@ -14,41 +46,33 @@ class MCPServer:
     """
     
     def __init__(self):
-        self.contexts: Dict[str, Dict[str, Any]] = {}
-        self.application_states: Dict[str, Dict[str, Any]] = {}
-        self.agent_history: Dict[str, List[Dict[str, Any]]] = {}
-        self.lock = threading.Lock()
+        # One record per application, so each call does a single lookup; writers
+        # take the record's own lock, and single dict lookups need none under the GIL
+        self.records: Dict[str, AppRecord] = {}
         
     def create_context(self, application_id: str, initial_data: Dict[str, Any]) -> str:
         """Create a new context for an application"""
-        with self.lock:
-            self.contexts[application_id] = {
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-                "data": initial_data,
-                "current_agent": None,
-                "status": "initiated"
-            }
-            self.application_states[application_id] = {
-                "stage": "intake",
-                "decisions": [],
-                "flags": [],
-                "documents": []
-            }
-            self.agent_history[application_id] = []
-            return application_id
+        now = time.time()
+        self.records[application_id] = AppRecord(created_at=now, updated_at=now, data=initial_data)
+        return application_id
     
     def set_application_state(self, application_id: str, stage: str, 
                             status: str, agent: str) -> bool:
         """Update application state and current agent"""
-        with self.lock:
-            if application_id in self.contexts:
-                self.contexts[application_id]["status"] = status
-                self.contexts[application_id]["current_agent"] = agent
-                self.application_states[application_id]["stage"] = stage
-                self.application_states[application_id]["updated_at"] = datetime.now().isoformat()
-                return True
+        record = self.records.get(application_id)
+        if record is None:
             return False
+        with record.lock:
+            self._set_state(record, time.time(), stage, status, agent)
+        return True
+    
+    @staticmethod
+    def _set_state(record: AppRecord, now: float, stage: str, status: str, agent: str):
+        """Apply a state update; caller holds the lock"""
+        record.status = status
+        record.current_agent = agent
+        record.stage = stage
+        record.updated_at = now
     
     def a2a_handoff(self, application_id: str, from_agent: str, 
                    to_agent: str, context_update: Dict[str, Any]) -> Dict[str, Any]:
@@ -56,73 +80,98 @@ class MCPServer:
         Agent-to-Agent (A2A) handoff with context transfer
         Transfers context and control from one agent to another
         """
-        with self.lock:
-            if application_id not in self.contexts:
-                return {"success": False, "error": "Application not found"}
-            
-            # Record handoff in history
-            handoff_record = {
-                "timestamp": datetime.now().isoformat(),
-                "from_agent": from_agent,
-                "to_agent": to_agent,
-                "context_update": context_update,
-                "status": "completed"
-            }
-            
-            self.agent_history[application_id].append(handoff_record)
-            
-            # Update context
-            self.contexts[application_id]["data"].update(context_update)
-            self.contexts[application_id]["current_agent"] = to_agent
-            self.contexts[application_id]["updated_at"] = datetime.now().isoformat()
+        return self.batch_update(application_id, [("handoff", from_agent, to_agent, context_update)])
+    
+    def batch_update(self, application_id: str, events: List[Tuple]) -> Dict[str, Any]:
+        """
+        Apply several handoffs and state changes under one lock acquisition
+        events are ("handoff", from_agent, to_agent, context_update) or
+        ("state", stage, status, agent) tuples, applied in order
+        """
+        record = self.records.get(application_id)
+        if record is None:
+            return {"success": False, "error": "Application not found"}
+        
+        # One timestamp for the whole batch
+        now = time.time()
+        with record.lock:
+            for kind, *args in events:
+                if kind == "handoff":
+                    self._handoff(record, now, *args)
+                elif kind == "state":
+                    self._set_state(record, now, *args)
+                else:
+                    raise ValueError(f"Unknown MCP event: {kind}")
             
-            # Return context for new agent
+            # Return (a snapshot of) the context for the new agent
             return {
                 "success": True,
                 "application_id": application_id,
-                "context": self.contexts[application_id]["data"],
-                "state": self.application_states[application_id],
-                "history": self.agent_history[application_id]
+                "context": dict(record.data),
+                "state": record.state(),
+                "history": list(record.history)
             }
     
+    @staticmethod
+    def _handoff(record: AppRecord, now: float, from_agent: str, to_agent: str, context_update: Dict[str, Any]):
+        """Record a handoff and merge its context update; caller holds the lock"""
+        # Record handoff in history
+        handoff_record = {
+            "timestamp": now,
+            "from_agent": from_agent,
+            "to_agent": to_agent,
+            "context_update": context_update,
+            "status": "completed"
+        }
+        
+        record.history.append(handoff_record)
+        
+        # Update context
+        record.data.update(context_update)
+        record.current_agent = to_agent
+        record.updated_at = now
+    
     def add_decision(self, application_id: str, agent: str, 
                     decision: str, rationale: str) -> bool:
         """Add a decision made by an agent"""
-        with self.lock:
-            if application_id in self.application_states:
-                self.application_states[application_id]["decisions"].append({
-                    "timestamp": datetime.now().isoformat(),
-                    "agent": agent,
-                    "decision": decision,
-                    "rationale": rationale
-                })
-                return True
+        record = self.records.get(application_id)
+        if record is None:
             return False
+        with record.lock:
+            record.decisions.append({
+                "timestamp": time.time(),
+                "agent": agent,
+                "decision": decision,
+                "rationale": rationale
+            })
+        return True
     
     def add_flag(self, application_id: str, flag_type: str, 
                 description: str, severity: str = "medium") -> bool:
         """Add a compliance or review flag"""
-        with self.lock:
-            if application_id in self.application_states:
-                self.application_states[application_id]["flags"].append({
-                    "timestamp": datetime.now().isoformat(),
-                    "type": flag_type,
-                    "description": description,
-                    "severity": severity,
-                    "resolved": False
-                })
-                return True
+        record = self.records.get(application_id)
+        if record is None:
             return False
+        with record.lock:
+            record.flags.append({
+                "timestamp": time.time(),
+                "type": flag_type,
+                "description": description,
+                "severity": severity,
+                "resolved": False
+            })
+        return True
     
     def get_application_history(self, application_id: str) -> List[Dict[str, Any]]:
-        """Get complete history of agent interactions"""
-        return self.agent_history.get(application_id, [])
+        """Get the latest HISTORY_LIMIT agent interactions (a list copy; read without locking)"""
+        record = self.records.get(application_id)
+        return list(record.history) if record is not None else []
     
     def get_application_state(self, application_id: str) -> Optional[Dict[str, Any]]:
         """Get current application state"""
-        return self.application_states.get(application_id)
+        record = self.records.get(application_id)
+        return record.state() if record is not None else None
 
 
 # Global MCP Server instance
 mcp_server = MCPServer()
-